@@ -15,6 +15,7 @@ setup(
     install_requires=[
         'irc',
         'markovify',
+        'numpy',
         'pymongo',
         'requests',
         'wikipedia',
@@ -23,6 +24,9 @@ setup(
     ],
     entry_points={
         'console_scripts': ['volbot=volbot.volbot:main', 'volbot-curses=volbot.scripts.curses:main',
-                            'volbot-dirtytalk=volbot.scripts.dirtytalk:main'],
+                            'volbot-dirtytalk=volbot.scripts.dirtytalk:main',
+                            'volbot-markov=volbot.scripts.markov:main',
+                            'volbot-migrate=volbot.scripts.migrate:main',
+                            'volbot-calctab=volbot.scripts.calctab:main'],
     }
 )
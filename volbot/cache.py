@@ -0,0 +1,155 @@
+"""cache.py - In-memory TTL/LRU cache with negative caching and an optional disk tier"""
+
+import collections
+import shelve
+import threading
+import time
+
+
+MISSING = object()
+
+
+class TTLCache(object):
+    """A thread-safe cache whose entries expire after ttl seconds.
+
+    At most maxsize entries are kept in memory; the least recently used
+    entry is evicted first.  Failures can be cached too (for negative_ttl
+    seconds) by storing the exception, which is re-raised on lookup.  If
+    path is given, successful entries are also written to a shelve file so
+    they survive restarts.  Concurrent fetch() calls for the same missing
+    key are coalesced into a single call to the loader.
+    """
+
+    def __init__(self, maxsize=1024, ttl=3600, negative_ttl=60, path=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+
+        self._lock = threading.RLock()
+        self._entries = collections.OrderedDict()  # key -> (expires, value, error)
+        self._inflight = {}  # key -> Event set once the loader finishes
+        self._disk = shelve.open(path) if path else None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _disk_key(self, key):
+        return repr(key)
+
+    def _lookup(self, key):
+        """Return the live entry for key, or None"""
+        now = time.time()
+        entry = self._entries.pop(key, None)
+        if entry is None and self._disk is not None:
+            entry = self._disk.get(self._disk_key(key))
+        if entry is None:
+            return None
+        if entry[0] is not None and entry[0] < now:
+            if self._disk is not None:
+                self._disk.pop(self._disk_key(key), None)
+            return None
+        # re-insert so the entry becomes the most recently used
+        self._store(key, entry)
+        return entry
+
+    def _store(self, key, entry):
+        self._entries.pop(key, None)
+        self._entries[key] = entry
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default on a miss.
+
+        If a failure was cached for key, the stored exception is raised.
+        """
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            if entry[2] is not None:
+                self.negative_hits += 1
+                raise entry[2]
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        """Cache value for key"""
+        ttl = self.ttl if ttl is None else ttl
+        entry = (time.time() + ttl if ttl else None, value, None)
+        with self._lock:
+            self._store(key, entry)
+            if self._disk is not None:
+                self._disk[self._disk_key(key)] = entry
+
+    def set_failure(self, key, error, ttl=None):
+        """Cache an exception for key, to be raised on lookups"""
+        ttl = self.negative_ttl if ttl is None else ttl
+        with self._lock:
+            self._store(key, (time.time() + ttl, None, error))
+
+    def fetch(self, key, loader):
+        """Return the value for key, calling loader() to compute it on a miss.
+
+        Exceptions raised by loader are cached as failures and re-raised.
+        If another thread is already loading key, wait for its result
+        instead of calling loader again.
+        """
+        value = self.get(key, MISSING)
+        if value is not MISSING:
+            return value
+
+        with self._lock:
+            done = self._inflight.get(key)
+            loading = done is None
+            if loading:
+                done = self._inflight[key] = threading.Event()
+            else:
+                self.coalesced += 1
+
+        if not loading:
+            done.wait()
+            value = self.get(key, MISSING)
+            if value is not MISSING:
+                return value
+            return self.fetch(key, loader)  # the result expired or was evicted already
+
+        try:
+            value = loader()
+        except Exception as e:
+            self.set_failure(key, e)
+            raise
+        else:
+            self.set(key, value)
+            return value
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            done.set()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._disk is not None:
+                self._disk.clear()
+
+    def close(self):
+        """Write the disk tier out and close it"""
+        with self._lock:
+            if self._disk is not None:
+                self._disk.close()
+                self._disk = None
+
+    def __str__(self):
+        lookups = self.hits + self.negative_hits + self.misses
+        return "size=%d/%d hits=%d negative_hits=%d misses=%d coalesced=%d evictions=%d (%.0f%% hit rate)" % (
+            len(self._entries), self.maxsize, self.hits, self.negative_hits, self.misses, self.coalesced,
+            self.evictions, 100.0 * (self.hits + self.negative_hits) / lookups if lookups else 0.0)
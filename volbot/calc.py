@@ -1,9 +1,21 @@
+import collections
+import copy
 import math
+import os
 import random
+import sys
+import threading
 
 import ply.lex
 import ply.yacc
 
+# prebuilt tables (regenerate with volbot-calctab after changing the grammar)
+import calc_lextab
+import calc_parsetab
+from utils import lazy_import
+
+np = lazy_import('numpy')
+
 
 ##############################################################
 # Initialization
@@ -13,6 +25,12 @@ import ply.yacc
 MAX_MULT = 10**10000
 MAX_EXP = 9999
 MAX_FACT = 9999
+MAX_ARRAY = 10**6
+# array elements are int64 or float, so 170! is the largest factorial one holds
+MAX_ARRAY_FACT = 170
+
+# number of compiled expressions to keep
+CACHE_SIZE = 1024
 
 # pre-defined functions
 funcs = {
@@ -26,13 +44,16 @@ funcs = {
 
 
 # pre-defined variables
-variables  = {
+constants = {
     'pi': math.pi,
     'e': math.e,
     'True': True,
     'False': False,
 }
 
+# variables used by the module-level eval()
+variables = dict(constants)
+
 # make certain math library functions available
 math_funcs = [
     'acos', 'acosh', 'asin', 'asinh', 'atan', 'atan2', 'atanh','ceil',
@@ -45,6 +66,118 @@ for f in math_funcs:
     funcs[f] = getattr(math, f)
 
 
+##############################################################
+# Arrays
+#
+# range() and [a, b, ...] make NumPy arrays.  Functions in
+# array_funcs take arrays directly; any other function given an
+# array argument is applied elementwise.
+##############################################################
+
+def make_range(*args):
+    """range([start,] stop[, step]) as an array"""
+    if not 1 <= len(args) <= 3:
+        abort("range takes 1 to 3 arguments")
+    for arg in args:
+        if is_array(arg) or int(arg) != arg or abs(arg) >= 2**63:
+            abort("Bad range argument: %s" % arg)
+    ints = [int(arg) for arg in args]
+    if len(ints) == 1:
+        ints.insert(0, 0)
+    if len(ints) == 2:
+        ints.append(1)
+    start, stop, step = ints
+    if step == 0:
+        abort("range step must not be zero")
+    check_size((stop - start + step - (1 if step > 0 else -1)) // step)
+    return np.arange(start, stop, step, dtype=np.int64)
+
+def make_array(values):
+    for value in values:
+        if isinstance(value, np.ndarray):
+            abort("Nested lists aren't supported.")
+    return numeric(np.array(values))
+
+def numeric(a):
+    """Return an array of Python numbers (dtype object) as int64 if they all
+    fit, otherwise as floats; abort if they don't fit in a float either"""
+    if not is_array(a) or a.dtype != object:
+        return a
+    values = a.ravel().tolist()
+    if not all(isinstance(v, (int, long, float)) for v in values):
+        abort("Unsupported values in a list.")
+    if all(isinstance(v, bool) for v in values):
+        return a.astype(bool)
+    if all(isinstance(v, (int, long)) and -2**63 <= v < 2**63 for v in values):
+        return a.astype(np.int64)
+    try:
+        return np.array([float(v) for v in values]).reshape(a.shape)
+    except OverflowError:
+        abort("Number too large for a list.")
+
+def array_operand(a):
+    """Convert a scalar used with an array to something NumPy won't turn into
+    an array of Python longs"""
+    if isinstance(a, long) and not -2**63 <= a < 2**63:
+        try:
+            return float(a)
+        except OverflowError:
+            abort("Number too large to use with a list.")
+    return a
+
+def apply_binop(func, a, b):
+    """Apply a binary operator, keeping array results int64 or float"""
+    if is_array(a) or is_array(b):
+        return numeric(func(array_operand(a), array_operand(b)))
+    return func(a, b)
+
+def aggregate(name):
+    """Wrap a NumPy reduction to take an array or several numbers"""
+    def reduce(*args):
+        if not args:
+            abort("Nothing to aggregate.")
+        values = args[0] if len(args) == 1 else make_array(list(args))
+        if np.size(values) == 0:
+            abort("Nothing to aggregate.")
+        if name == 'sum' and is_int_array(values) and bits(values) + math.log(values.size, 2) >= 63:
+            values = values.astype(object)  # exact, where int64 would wrap around
+        return np.asarray(getattr(np, name)(values)).item()
+    return reduce
+
+array_funcs = {
+    'range': make_range,
+    'len': lambda a: np.size(a),
+    'sum': aggregate('sum'),
+    'mean': aggregate('mean'),
+    'min': aggregate('min'),
+    'max': aggregate('max'),
+    'std': aggregate('std'),
+}
+funcs.update(array_funcs)
+
+# NumPy names for math functions, where they differ
+_ufunc_names = {
+    'acos': 'arccos', 'acosh': 'arccosh', 'asin': 'arcsin', 'asinh': 'arcsinh',
+    'atan': 'arctan', 'atan2': 'arctan2', 'atanh': 'arctanh', 'pow': 'power',
+}
+
+def elementwise(name, args):
+    """Apply funcs[name] to each element of the array arguments"""
+    if name == 'factorial' and len(args) == 1:
+        return op_fact(args[0])  # which checks the total work
+    ufunc = getattr(np, _ufunc_names.get(name, name), None)
+    if not isinstance(ufunc, np.ufunc) or ufunc.nin != len(args):
+        ufunc = np.vectorize(funcs[name], otypes=[object])
+    return numeric(ufunc(*[array_operand(arg) for arg in args]))
+
+def call_func(name, args):
+    """Call a pre-defined function, elementwise if given arrays"""
+    check_func(name)
+    if name not in array_funcs and any(isinstance(arg, np.ndarray) for arg in args):
+        return elementwise(name, args)
+    return funcs[name](*args)
+
+
 ##############################################################
 # Lexical Analysis
 ##############################################################
@@ -57,7 +190,7 @@ tokens = (
 )
 
 # single-character tokens (most operators)
-literals = ';=,<>|^&+-*/%~!()'
+literals = ';=,<>|^&+-*/%~!()[]'
 
 # multi-character operators
 t_LTEQ = '<='
@@ -118,29 +251,28 @@ t_ignore = ' \t\r\n'
 
 ##############################################################
 # Grammar Rules
+#
+# The grammar actions only build a syntax tree of tuples:
+#   ('num', value), ('var', name), ('call', name, [args]),
+#   ('unop', op, operand), ('binop', op, left, right),
+#   ('assign', op, name, value), ('list', [items])
+# Operators applied to literal operands are folded while parsing.
 ##############################################################
 
 def p_commands(p):
     'commands : command'
-    p[0] = p[1]
+    p[0] = [p[1]]
 def p_commands_more(p):
     'commands : command ";" commands'
-    # the result of a string of commands is the result of the last command
-    # (that returned a non-null value)
-    if p[3] is not None:
-        p[0] = p[3]
-    else:
-        p[0] = p[1]
+    p[0] = [p[1]] + p[3]
 
 def p_command(p):
     'command : assign'
-    # set the variable '_' to result of most recent command
-    variables['_'] = p[1]
     p[0] = p[1]
 def p_command_blank(p):
     'command : '
     # allow blank commands, why not?
-    pass
+    p[0] = None
 
 # lots and lots of alternate assignment rules...
 def p_assign(p):
@@ -148,179 +280,137 @@ def p_assign(p):
     p[0] = p[1]
 def p_assign_eq(p):
     'assign : ID "=" assign'
-    name = p[1]
-    variables[name] = p[3]
-    p[0] = variables[name]
+    p[0] = ('assign', '=', p[1], p[3])
 def p_assign_oreq(p):
     'assign : ID OREQ assign'
-    name = p[1]
-    check_var(name)
-    variables[name] |= p[3]
-    p[0] = variables[name]
+    p[0] = ('assign', '|', p[1], p[3])
 def p_assign_xoreq(p):
     'assign : ID XOREQ assign'
-    name = p[1]
-    check_var(name)
-    variables[name] ^= p[3]
-    p[0] = variables[name]
+    p[0] = ('assign', '^', p[1], p[3])
 def p_assign_andeq(p):
     'assign : ID ANDEQ assign'
-    name = p[1]
-    check_var(name)
-    variables[name] &= p[3]
-    p[0] = variables[name]
+    p[0] = ('assign', '&', p[1], p[3])
 def p_assign_lshifteq(p):
     'assign : ID LSHIFTEQ assign'
-    name = p[1]
-    check_var(name)
-    check_lshift(variables[name], p[3])
-    variables[name] <<= p[3]
-    p[0] = variables[name]
+    p[0] = ('assign', '<<', p[1], p[3])
 def p_assign_rshifteq(p):
     'assign : ID RSHIFTEQ assign'
-    name = p[1]
-    check_var(name)
-    variables[name] >>= p[3]
-    p[0] = variables[name]
+    p[0] = ('assign', '>>', p[1], p[3])
 def p_assign_pluseq(p):
     'assign : ID PLUSEQ assign'
-    name = p[1]
-    check_var(name)
-    variables[name] += p[3]
-    p[0] = variables[name]
+    p[0] = ('assign', '+', p[1], p[3])
 def p_assign_minuseq(p):
     'assign : ID MINUSEQ assign'
-    name = p[1]
-    check_var(name)
-    variables[name] -= p[3]
-    p[0] = variables[name]
+    p[0] = ('assign', '-', p[1], p[3])
 def p_assign_timeseq(p):
     'assign : ID TIMESEQ assign'
-    name = p[1]
-    check_var(name)
-    check_mult(variables[name])
-    check_mult(p[3])
-    variables[name] *= p[3]
-    p[0] = variables[name]
+    p[0] = ('assign', '*', p[1], p[3])
 def p_assign_diveq(p):
     'assign : ID DIVEQ assign'
-    name = p[1]
-    check_var(name)
-    variables[name] /= p[3]
-    p[0] = variables[name]
+    p[0] = ('assign', '/', p[1], p[3])
 def p_assign_modeq(p):
     'assign : ID MODEQ assign'
-    name = p[1]
-    check_var(name)
-    variables[name] %= p[3]
-    p[0] = variables[name]
+    p[0] = ('assign', '%', p[1], p[3])
 def p_assign_expeq(p):
     'assign : ID EXPEQ assign'
-    name = p[1]
-    check_var(name)
-    check_exp(variables[name], p[3])
-    variables[name] **= p[3]
-    p[0] = variables[name]
+    p[0] = ('assign', '**', p[1], p[3])
 
 def p_expr(p):
     'expr : bort'
     p[0] = p[1]
 def p_expr_bor(p):
     'expr : expr OR bort'
-    p[0] = p[1] or p[3]
+    p[0] = binop('or', p[1], p[3])
 
 def p_bort(p):
     'bort : bandt'
     p[0] = p[1]
 def p_bort_band(p):
     'bort : bort AND bandt'
-    p[0] = p[1] and p[3]
+    p[0] = binop('and', p[1], p[3])
 
 def p_bandt(p):
     'bandt : bnott'
     p[0] = p[1]
 def p_bandt_bnot(p):
     'bandt : NOT bandt'
-    p[0] = not p[2]
+    p[0] = unop('not', p[2])
 
 def p_bnott(p):
     'bnott : compt'
     p[0] = p[1]
 def p_bnott_lt(p):
     'bnott : bnott "<" compt'
-    p[0] = p[1] < p[3]
+    p[0] = binop('<', p[1], p[3])
 def p_bnott_lteq(p):
     'bnott : bnott LTEQ compt'
-    p[0] = p[1] <= p[3]
+    p[0] = binop('<=', p[1], p[3])
 def p_bnott_gt(p):
     'bnott : bnott ">" compt'
-    p[0] = p[1] > p[3]
+    p[0] = binop('>', p[1], p[3])
 def p_bnott_gteq(p):
     'bnott : bnott GTEQ compt'
-    p[0] = p[1] >= p[3]
+    p[0] = binop('>=', p[1], p[3])
 def p_bnott_eq(p):
     'bnott : bnott EQ compt'
-    p[0] = p[1] == p[3]
+    p[0] = binop('==', p[1], p[3])
 def p_bnott_neq(p):
     'bnott : bnott NEQ compt'
-    p[0] = p[1] != p[3]
+    p[0] = binop('!=', p[1], p[3])
 
 def p_compt(p):
     'compt : ort'
     p[0] = p[1]
 def p_compt_or(p):
     'compt : compt "|" ort'
-    p[0] = p[1] | p[3]
+    p[0] = binop('|', p[1], p[3])
 
 def p_ort(p):
     'ort : xort'
     p[0] = p[1]
 def p_ort_xor(p):
     'ort : ort "^" xort'
-    p[0] = p[1] ^ p[3]
+    p[0] = binop('^', p[1], p[3])
 
 def p_xort(p):
     'xort : andt'
     p[0] = p[1]
 def p_xort_and(p):
     'xort : xort "&" andt'
-    p[0] = p[1] & p[3]
+    p[0] = binop('&', p[1], p[3])
 
 def p_andt(p):
     'andt : shiftt'
     p[0] = p[1]
 def p_andt_lshift(p):
     'andt : andt LSHIFT shiftt'
-    check_lshift(p[1], p[3])
-    p[0] = p[1] << p[3]
+    p[0] = binop('<<', p[1], p[3])
 def p_andt_rshift(p):
     'andt : andt RSHIFT shiftt'
-    p[0] = p[1] >> p[3]
+    p[0] = binop('>>', p[1], p[3])
 
 def p_shiftt(p):
     'shiftt : addt'
     p[0] = p[1]
 def p_shiftt_add(p):
     'shiftt : shiftt "+" addt'
-    p[0] = p[1] + p[3]
+    p[0] = binop('+', p[1], p[3])
 def p_shiftt_sub(p):
     'shiftt : shiftt "-" addt'
-    p[0] = p[1] - p[3]
+    p[0] = binop('-', p[1], p[3])
 
 def p_addt(p):
     'addt : multt'
     p[0] = p[1]
 def p_addt_mult(p):
     'addt : addt "*" multt'
-    check_mult(p[1])
-    check_mult(p[3])
-    p[0] = p[1] * p[3]
+    p[0] = binop('*', p[1], p[3])
 def p_addt_div(p):
     'addt : addt "/" multt'
-    p[0] = p[1] / p[3]
+    p[0] = binop('/', p[1], p[3])
 def p_addt_mod(p):
     'addt : addt "%" multt'
-    p[0] = p[1] % p[3]
+    p[0] = binop('%', p[1], p[3])
 
 def p_multt(p):
     'multt : factt'
@@ -330,51 +420,233 @@ def p_multt_pos(p):
     p[0] = p[2]
 def p_multt_neg(p):
     'multt : "-" multt'
-    p[0] = -p[2]
+    p[0] = unop('-', p[2])
 def p_multt_not(p):
     'multt : "~" multt'
-    p[0] = ~p[2]
+    p[0] = unop('~', p[2])
 def p_multt_exp(p):
     'multt : val EXP multt'
-    check_exp(p[1], p[3])
-    p[0] = p[1] ** p[3]
+    p[0] = binop('**', p[1], p[3])
 
 def p_factt(p):
     'factt : val'
     p[0] = p[1]
 def p_factt_fact(p):
     'factt : factt "!"'
-    check_fact(p[1])
-    p[0] = math.factorial(p[1])
+    p[0] = unop('!', p[1])
 
 def p_val_int(p):
     'val : INT'
-    p[0] = p[1]
+    p[0] = ('num', p[1])
 def p_val_float(p):
     'val : FLOAT'
-    p[0] = p[1]
+    p[0] = ('num', p[1])
 def p_val_id(p):
     'val : ID'
-    check_var(p[1])
-    p[0] = variables[p[1]]
+    p[0] = ('var', p[1])
 def p_val_func(p):
     'val : ID "(" args ")"'
-    check_func(p[1])
-    p[0] = funcs[p[1]](*p[3])
+    p[0] = ('call', p[1], p[3])
 def p_val_func_empty(p):
     'val : ID "(" ")"'
-    check_func(p[1])
-    p[0] = funcs[p[1]]()
+    p[0] = ('call', p[1], [])
 def p_val_expr(p):
     'val : "(" expr ")"'
     p[0] = p[2]
+def p_val_list(p):
+    'val : "[" args "]"'
+    p[0] = ('list', p[2])
+def p_val_list_empty(p):
+    'val : "[" "]"'
+    p[0] = ('list', [])
 
 def p_args_args(p):
     'args : args "," expr'
-    p[0] = p[1] + (p[3],)
+    p[0] = p[1] + [p[3]]
 def p_args_expr(p):
     'args : expr'
-    p[0] = (p[1],)
+    p[0] = [p[1]]
+
+
+##############################################################
+# Operators
+##############################################################
+
+def bits(a):
+    """Roughly how many bits the largest magnitude in a needs"""
+    return math.log(largest(a) + 1, 2)
+
+def widened(a, b, result_bits):
+    """Return a and b as floats if an integer array result could overflow"""
+    if result_bits >= 63 and (is_int_array(a) or is_int_array(b)):
+        return np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+    return a, b
+
+def op_add(a, b):
+    if is_array(a) or is_array(b):
+        a, b = widened(a, b, max(bits(a), bits(b)) + 1)
+    return a + b
+
+def op_sub(a, b):
+    if is_array(a) or is_array(b):
+        a, b = widened(a, b, max(bits(a), bits(b)) + 1)
+    return a - b
+
+def op_mult(a, b):
+    check_mult(a)
+    check_mult(b)
+    if is_array(a) or is_array(b):
+        a, b = widened(a, b, bits(a) + bits(b))
+    return a * b
+
+def op_exp(a, b):
+    check_exp(a, b)
+    if is_array(a) or is_array(b):
+        a, b = widened(a, b, bits(a) * max(peak(b), 1))
+    return a ** b
+
+def op_lshift(a, b):
+    check_lshift(a, b)
+    if is_array(a) or is_array(b):
+        a, b = widened(a, b, bits(a) + max(peak(b), 0))
+        if not is_int_array(a):
+            return a * 2.0 ** b
+    return a << b
+
+def op_fact(a):
+    check_fact(a)
+    if is_array(a):
+        return numeric(np.vectorize(math.factorial, otypes=[object])(a))
+    return math.factorial(a)
+
+binops = {
+    'or': lambda a, b: a or b,
+    'and': lambda a, b: a and b,
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+    '==': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '|': lambda a, b: a | b,
+    '^': lambda a, b: a ^ b,
+    '&': lambda a, b: a & b,
+    '<<': op_lshift,
+    '>>': lambda a, b: a >> b,
+    '+': op_add,
+    '-': op_sub,
+    '*': op_mult,
+    '/': lambda a, b: a / b,
+    '%': lambda a, b: a % b,
+    '**': op_exp,
+}
+
+unops = {
+    'not': lambda a: not a,
+    '-': lambda a: -a,
+    '~': lambda a: ~a,
+    '!': op_fact,
+}
+
+def binop(op, left, right):
+    """Build a binary operator node, folding it if both operands are literals"""
+    if left[0] == 'num' and right[0] == 'num':
+        try:
+            return ('num', binops[op](left[1], right[1]))
+        except Exception:
+            pass  # leave it for evaluation to report
+    return ('binop', op, left, right)
+
+def unop(op, operand):
+    """Build a unary operator node, folding it if the operand is a literal"""
+    if operand[0] == 'num':
+        try:
+            return ('num', unops[op](operand[1]))
+        except Exception:
+            pass
+    return ('unop', op, operand)
+
+
+##############################################################
+# Compilation
+##############################################################
+
+def compile_node(node):
+    """Turn a syntax tree node into a function of a variable scope"""
+    kind = node[0]
+
+    if kind == 'num':
+        value = node[1]
+        return lambda scope: value
+
+    if kind == 'var':
+        name = node[1]
+        def var(scope):
+            check_var(name, scope)
+            return scope[name]
+        return var
+
+    if kind == 'call':
+        name = node[1]
+        args = [compile_node(arg) for arg in node[2]]
+        def call(scope):
+            return call_func(name, [arg(scope) for arg in args])
+        return call
+
+    if kind == 'list':
+        items = [compile_node(item) for item in node[1]]
+        return lambda scope: make_array([item(scope) for item in items])
+
+    if kind == 'unop':
+        func = unops[node[1]]
+        operand = compile_node(node[2])
+        return lambda scope: func(operand(scope))
+
+    if kind == 'binop':
+        func = binops[node[1]]
+        left = compile_node(node[2])
+        right = compile_node(node[3])
+        def apply(scope):
+            a = left(scope)
+            return apply_binop(func, a, right(scope))
+        return apply
+
+    if kind == 'assign':
+        op, name = node[1], node[2]
+        value = compile_node(node[3])
+        if op == '=':
+            def assign(scope):
+                scope[name] = value(scope)
+                return scope[name]
+        else:
+            func = binops[op]
+            def assign(scope):
+                b = value(scope)
+                check_var(name, scope)
+                scope[name] = apply_binop(func, scope[name], b)
+                return scope[name]
+        return assign
+
+    raise ValueError("Unknown node: %r" % (node,))
+
+def compile_commands(commands):
+    """Compile a list of commands into a function of a variable scope"""
+    compiled = [compile_node(cmd) for cmd in commands if cmd is not None]
+    def run(scope):
+        # the result of a string of commands is the result of the last command
+        # (that returned a non-null value)
+        result = None
+        # array arithmetic reports overflow and division by zero like
+        # Python's does, instead of giving wrong answers
+        with np.errstate(over='raise', divide='raise', invalid='raise'):
+            for command in compiled:
+                value = command(scope)
+                # set the variable '_' to result of most recent command
+                scope['_'] = value
+                if value is not None:
+                    result = value
+        return result
+    return run
 
 
 ##############################################################
@@ -398,9 +670,9 @@ def abort(msg):
     """Raise a CalculationException with given message"""
     raise CalculationException(msg)
 
-def check_var(name):
+def check_var(name, scope=None):
     """Check if a variable exists; if not, abort"""
-    if name not in variables:
+    if name not in (variables if scope is None else scope):
         abort("Unknown variable: %s" % name)
 
 def check_func(name):
@@ -411,50 +683,203 @@ def check_func(name):
 def check_lshift(a, b):
     """Check if left shift operands are too big; if so, abort"""
     # a << b is equivalent to a * (2**b), so treat a as mulitplicand and b as exponent
-    if a > MAX_MULT:
-        abort("Number too large to shift: %s" % a)
-    if b > MAX_EXP:
-        abort("Shift amount too large: %s" % b)
+    if peak(a) > MAX_MULT:
+        abort("Number too large to shift: %s" % peak(a))
+    if peak(b) > MAX_EXP:
+        abort("Shift amount too large: %s" % peak(b))
 
 def check_mult(*nums):
     """Check if multiplication operands are too big; if so, abort"""
     for a in nums:
-        if abs(a) > MAX_MULT:
-            abort("Number too large to multiply: %s" % a)
+        if largest(a) > MAX_MULT:
+            abort("Number too large to multiply: %s" % largest(a))
 
 def check_exp(a, b):
     """Check if exponentiation operands are too big; if so, abort"""
-    if abs(a) > MAX_MULT:
-        abort("Number too large for exponent base: %s" % a)
-    if b > MAX_EXP:
-        abort("Number too large for exponent: %s" % b)
+    if largest(a) > MAX_MULT:
+        abort("Number too large for exponent base: %s" % largest(a))
+    if peak(b) > MAX_EXP:
+        abort("Number too large for exponent: %s" % peak(b))
     
 def check_fact(a):
-    """Check if factorial operand is too big; if so, abort"""
-    if a > MAX_FACT:
-        abort("Factorial too large: %d" % a)
+    """Check if factorial operand is too big; if so, abort.
+
+    n! costs roughly n**2, so an array's factorials together may cost no
+    more than a single MAX_FACT!.
+    """
+    if peak(a) > MAX_FACT:
+        abort("Factorial too large: %d" % peak(a))
+    if is_array(a):
+        if peak(a) > MAX_ARRAY_FACT:
+            abort("Factorial too large for a list: %d" % peak(a))
+        if a.size * (peak(a) ** 2 + 1) > MAX_FACT ** 2:
+            abort("Too many factorials: %d" % a.size)
+
+def check_size(size):
+    """Check if an array would be too big; if so, abort"""
+    if size > MAX_ARRAY:
+        abort("Range too large: %d elements" % size)
+
+def is_array(a):
+    return isinstance(a, np.ndarray)
+
+def is_int_array(a):
+    return is_array(a) and a.dtype.kind in 'iu'
+
+def peak(a):
+    """a itself, or its largest element if a is an array"""
+    if is_array(a):
+        return a.max().item() if a.size else 0
+    return a
+
+def largest(a):
+    """abs(a), or the largest absolute element if a is an array"""
+    if is_array(a):
+        return np.abs(a).max().item() if a.size else 0
+    return abs(a)
 
 
 ##############################################################
 # Module Code
 ##############################################################
 
-lexer = ply.lex.lex()
-parser = ply.yacc.yacc()
+# prototype lexer and parser, built on first use; each Calculator gets its
+# own copy
+_lexer = None
+_parser = None
+_build_lock = threading.Lock()
+
+def prototypes():
+    """Return the prototype (lexer, parser), loading them from the prebuilt tables"""
+    global _lexer, _parser
+    with _build_lock:
+        if _parser is None:
+            module = sys.modules[__name__]
+            _lexer = ply.lex.lex(module=module, optimize=1, lextab=calc_lextab)
+            _parser = ply.yacc.yacc(module=module, optimize=1, tabmodule=calc_parsetab,
+                                    write_tables=False, debug=False)
+        return _lexer, _parser
+
+def build_tables(outputdir=None):
+    """Regenerate the calc_lextab and calc_parsetab modules from the grammar"""
+    outputdir = outputdir or os.path.dirname(os.path.abspath(__file__))
+    module = sys.modules[__name__]
+    ply.lex.lex(module=module).writetab('calc_lextab', outputdir)
+    ply.yacc.yacc(module=module, tabmodule='calc_parsetab', outputdir=outputdir, debug=False)
+
+# compiled expressions (or the error parsing them raised), by source;
+# shared by every Calculator since compiled functions take the scope
+_compiled = collections.OrderedDict()
+_compiled_lock = threading.Lock()
+
+
+class Calculator(object):
+    """A calculator with its own lexer/parser state and variable scope.
+
+    Construction is cheap: the lexer is cloned and the parser shallow-copied
+    from the module prototypes, so the parse tables are shared (the first
+    Calculator loads them).  Separate Calculators can be used from separate
+    threads at the same time; a single Calculator should only be used by one
+    thread at a time.
+    """
+
+    def __init__(self, scope=None):
+        lexer, parser = prototypes()
+        self.lexer = lexer.clone()
+        self.parser = copy.copy(parser)
+        self.variables = dict(constants) if scope is None else scope
+
+    def parse(self, expr):
+        """Parse a string of expressions into a list of syntax trees."""
+        return self.parser.parse(expr, lexer=self.lexer)
+
+    def compile(self, expr):
+        """Return a compiled function of a variable scope for expr.
+
+        Results are cached by source, so evaluating the same expression
+        again skips the parser.  Expressions that fail to parse are cached
+        too.
+        """
+        with _compiled_lock:
+            compiled = _compiled.pop(expr, None)
+            if compiled is not None:
+                _compiled[expr] = compiled
+        if compiled is None:
+            try:
+                compiled = compile_commands(self.parse(expr))
+            except Exception as e:
+                compiled = CalculationException(str(e))
+            with _compiled_lock:
+                _compiled[expr] = compiled
+                while len(_compiled) > CACHE_SIZE:
+                    _compiled.popitem(last=False)
+        if isinstance(compiled, CalculationException):
+            raise CalculationException(str(compiled))
+        return compiled
+
+    def evaluate(self, expr):
+        """Evaluate a string of expressions in this calculator's scope."""
+        try:
+            return self.compile(expr)(self.variables)
+        except Exception as e:
+            raise CalculationException(str(e))
 
-def eval(expr):
-    """Evaluate a string of expressions and return the result."""
+
+# calculator behind the module-level functions, sharing the global variables
+_default = None
+_default_lock = threading.Lock()
+
+def _default_calculator():
+    global _default
+    if _default is None:
+        _default = Calculator(variables)
+    return _default
+
+def parse(expr):
+    """Parse a string of expressions into a list of syntax trees."""
+    with _default_lock:
+        return _default_calculator().parse(expr)
+
+def compile_expr(expr):
+    """Return a compiled function of a variable scope for expr."""
+    with _default_lock:
+        return _default_calculator().compile(expr)
+
+def evaluate(expr, scope):
+    """Evaluate a string of expressions with the given variables."""
     try:
-        return parser.parse(expr)
+        return compile_expr(expr)(scope)
     except Exception as e:
         raise CalculationException(str(e))
+
+def format_result(value, limit=None):
+    """Format the result of an evaluation as a single line of at most limit
+    characters.
+
+    Integers too long to show are refused before converting them, since
+    converting a huge long to decimal takes quadratic time.
+    """
+    if isinstance(value, (int, long)) and limit is not None:
+        digits = int(abs(value).bit_length() * math.log10(2))
+        if digits > limit:
+            raise CalculationException("Result is too long to show (about %d digits)." % digits)
+    if is_array(value):
+        text = np.array2string(value, max_line_width=sys.maxint, separator=', ', threshold=50, edgeitems=5)
+    else:
+        text = str(value)
+    if limit is not None and len(text) > limit:
+        text = text[:limit - 3] + '...'
+    return text
+
+def eval(expr):
+    """Evaluate a string of expressions and return the result."""
+    return evaluate(expr, variables)
         
 if __name__ == '__main__':
     while True:
         try:
-            print(eval(raw_input('> ')))
+            print(format_result(eval(raw_input('> '))))
         except CalculationException as e:
             print("Error: %s" % e)
         except KeyboardInterrupt:
             break
-
@@ -0,0 +1,10 @@
+# calc_lextab.py. This file automatically created by PLY (version 3.11). Don't edit!
+_tabversion   = '3.10'
+_lextokens    = set(('AND', 'ANDEQ', 'DIVEQ', 'EQ', 'EXP', 'EXPEQ', 'FLOAT', 'GTEQ', 'ID', 'INT', 'LSHIFT', 'LSHIFTEQ', 'LTEQ', 'MINUSEQ', 'MODEQ', 'NEQ', 'NOT', 'OR', 'OREQ', 'PLUSEQ', 'RSHIFT', 'RSHIFTEQ', 'TIMESEQ', 'XOREQ'))
+_lexreflags   = 64
+_lexliterals  = ';=,<>|^&+-*/%~!()[]'
+_lexstateinfo = {'INITIAL': 'inclusive'}
+_lexstatere   = {'INITIAL': [('(?P<t_ID>[a-zA-Z_][a-zA-Z0-9_]*)|(?P<t_FLOAT>(([0-9]+\\.[0-9]*|[0-9]*\\.[0-9]+)(e[+-]?[0-9]+)?)|[0-9]+e[+-]?[0-9]+)|(?P<t_INT>(0b[01]+)|(0o[0-7]+)|(0x[0-9a-fA-F]+)|([0-9]+))|(?P<t_EXPEQ>\\*\\*=)|(?P<t_EXP>\\*\\*)|(?P<t_LSHIFTEQ><<=)|(?P<t_PLUSEQ>\\+=)|(?P<t_XOREQ>\\^=)|(?P<t_RSHIFTEQ>>>=)|(?P<t_OREQ>\\|=)|(?P<t_TIMESEQ>\\*=)|(?P<t_RSHIFT>>>)|(?P<t_LSHIFT><<)|(?P<t_GTEQ>>=)|(?P<t_MINUSEQ>-=)|(?P<t_DIVEQ>/=)|(?P<t_MODEQ>%=)|(?P<t_EQ>==)|(?P<t_LTEQ><=)|(?P<t_NEQ>!=)|(?P<t_ANDEQ>&=)', [None, ('t_ID', 'ID'), ('t_FLOAT', 'FLOAT'), None, None, None, ('t_INT', 'INT'), None, None, None, None, (None, 'EXPEQ'), (None, 'EXP'), (None, 'LSHIFTEQ'), (None, 'PLUSEQ'), (None, 'XOREQ'), (None, 'RSHIFTEQ'), (None, 'OREQ'), (None, 'TIMESEQ'), (None, 'RSHIFT'), (None, 'LSHIFT'), (None, 'GTEQ'), (None, 'MINUSEQ'), (None, 'DIVEQ'), (None, 'MODEQ'), (None, 'EQ'), (None, 'LTEQ'), (None, 'NEQ'), (None, 'ANDEQ')])]}
+_lexstateignore = {'INITIAL': ' \t\r\n'}
+_lexstateerrorf = {'INITIAL': 't_error'}
+_lexstateeoff = {}
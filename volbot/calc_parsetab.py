@@ -0,0 +1,93 @@
+
+# calc_parsetab.py
+# This file is automatically generated. Do not edit.
+# pylint: disable=W,C,R
+_tabversion = '3.10'
+
+_lr_method = 'LALR'
+
+_lr_signature = 'AND ANDEQ DIVEQ EQ EXP EXPEQ FLOAT GTEQ ID INT LSHIFT LSHIFTEQ LTEQ MINUSEQ MODEQ NEQ NOT OR OREQ PLUSEQ RSHIFT RSHIFTEQ TIMESEQ XOREQcommands : commandcommands : command ";" commandscommand : assigncommand : assign : exprassign : ID "=" assignassign : ID OREQ assignassign : ID XOREQ assignassign : ID ANDEQ assignassign : ID LSHIFTEQ assignassign : ID RSHIFTEQ assignassign : ID PLUSEQ assignassign : ID MINUSEQ assignassign : ID TIMESEQ assignassign : ID DIVEQ assignassign : ID MODEQ assignassign : ID EXPEQ assignexpr : bortexpr : expr OR bortbort : bandtbort : bort AND bandtbandt : bnottbandt : NOT bandtbnott : comptbnott : bnott "<" comptbnott : bnott LTEQ comptbnott : bnott ">" comptbnott : bnott GTEQ comptbnott : bnott EQ comptbnott : bnott NEQ comptcompt : ortcompt : compt "|" ortort : xortort : ort "^" xortxort : andtxort : xort "&" andtandt : shifttandt : andt LSHIFT shifttandt : andt RSHIFT shifttshiftt : addtshiftt : shiftt "+" addtshiftt : shiftt "-" addtaddt : multtaddt : addt "*" multtaddt : addt "/" multtaddt : addt "%" multtmultt : facttmultt : "+" multtmultt : "-" multtmultt : "~" multtmultt : val EXP multtfactt : valfactt : factt "!"val : INTval : FLOATval : IDval : ID "(" args ")"val : ID "(" ")"val : "(" expr ")"val : "[" args "]"val : "[" "]"args : args "," exprargs : expr'
+    
+_lr_action_items = {'RSHIFT':([3,4,8,9,10,17,20,21,24,37,39,40,45,48,50,76,77,78,79,80,81,82,83,84,85,88,95,107,],[-40,-52,-37,43,-47,-56,-55,-54,-43,-56,-48,-49,-53,-50,-61,-44,-46,-45,-51,-59,-41,-42,-39,-38,43,-60,-58,-57,]),'EXP':([4,17,20,21,37,50,80,88,95,107,],[36,-56,-55,-54,-56,-61,-59,-60,-58,-57,]),'GTEQ':([1,3,4,8,9,10,11,12,15,17,20,21,24,37,39,40,45,48,50,69,70,71,72,73,74,76,77,78,79,80,81,82,83,84,85,86,87,88,95,107,],[26,-40,-52,-37,-35,-47,-33,-31,-24,-56,-55,-54,-43,-56,-48,-49,-53,-50,-61,-28,-26,-30,-29,-25,-27,-44,-46,-45,-51,-59,-41,-42,-39,-38,-36,-34,-32,-60,-58,-57,]),'ANDEQ':([17,],[61,]),'LSHIFT':([3,4,8,9,10,17,20,21,24,37,39,40,45,48,50,76,77,78,79,80,81,82,83,84,85,88,95,107,],[-40,-52,-37,44,-47,-56,-55,-54,-43,-56,-48,-49,-53,-50,-61,-44,-46,-45,-51,-59,-41,-42,-39,-38,44,-60,-58,-57,]),'NEQ':([1,3,4,8,9,10,11,12,15,17,20,21,24,37,39,40,45,48,50,69,70,71,72,73,74,76,77,78,79,80,81,82,83,84,85,86,87,88,95,107,],[28,-40,-52,-37,-35,-47,-33,-31,-24,-56,-55,-54,-43,-56,-48,-49,-53,-50,-61,-28,-26,-30,-29,-25,-27,-44,-46,-45,-51,-59,-41,-42,-39,-38,-36,-34,-32,-60,-58,-57,]),'!':([4,10,17,20,21,37,45,50,80,88,95,107,],[-52,45,-56,-55,-54,-56,-53,-61,-59,-60,-58,-57,]),'%':([3,4,10,17,20,21,24,37,39,40,45,48,50,76,77,78,79,80,81,82,88,95,107,],[34,-52,-47,-56,-55,-54,-43,-56,-48,-49,-53,-50,-61,-44,-46,-45,-51,-59,34,34,-60,-58,-57,]),'&':([3,4,8,9,10,11,17,20,21,24,37,39,40,45,48,50,76,77,78,79,80,81,82,83,84,85,86,88,95,107,],[-40,-52,-37,-35,-47,46,-56,-55,-54,-43,-56,-48,-49,-53,-50,-61,-44,-46,-45,-51,-59,-41,-42,-39,-38,-36,46,-60,-58,-57,]),')':([1,2,3,4,8,9,10,11,12,13,15,20,21,24,37,38,39,40,45,48,50,52,58,68,69,70,71,72,73,74,75,76,77,78,79,80,81,82,83,84,85,86,87,88,95,96,104,106,107,],[-22,-18,-40,-52,-37,-35,-47,-33,-31,-20,-24,-55,-54,-43,-56,80,-48,-49,-53,-50,-61,-63,95,-23,-28,-26,-30,-29,-25,-27,-21,-44,-46,-45,-51,-59,-41,-42,-39,-38,-36,-34,-32,-60,-58,107,-19,-62,-57,]),'(':([0,5,6,7,14,16,17,23,26,27,28,29,30,31,32,33,34,35,36,37,41,42,43,44,46,47,49,53,54,55,56,57,58,59,60,61,62,63,64,65,66,67,89,],[5,5,5,5,5,5,58,5,5,5,5,5,5,5,5,5,5,5,5,58,5,5,5,5,5,5,5,5,5,5,5,5,5,5,5,5,5,5,5,5,5,5,5,]),'+':([0,3,4,5,6,7,8,10,14,16,17,20,21,23,24,26,27,28,29,30,31,32,33,34,35,36,37,39,40,41,42,43,44,45,46,47,48,49,50,53,54,55,56,57,58,59,60,61,62,63,64,65,66,67,76,77,78,79,80,81,82,83,84,88,89,95,107,],[6,-40,-52,6,6,6,41,-47,6,6,-56,-55,-54,6,-43,6,6,6,6,6,6,6,6,6,6,6,-56,-48,-49,6,6,6,6,-53,6,6,-50,6,-61,6,6,6,6,6,6,6,6,6,6,6,6,6,6,6,-44,-46,-45,-51,-59,-41,-42,41,41,-60,6,-58,-57,]),'*':([3,4,10,17,20,21,24,37,39,40,45,48,50,76,77,78,79,80,81,82,88,95,107,],[33,-52,-47,-56,-55,-54,-43,-56,-48,-49,-53,-50,-61,-44,-46,-45,-51,-59,33,33,-60,-58,-57,]),'-':([0,3,4,5,6,7,8,10,14,16,17,20,21,23,24,26,27,28,29,30,31,32,33,34,35,36,37,39,40,41,42,43,44,45,46,47,48,49,50,53,54,55,56,57,58,59,60,61,62,63,64,65,66,67,76,77,78,79,80,81,82,83,84,88,89,95,107,],[7,-40,-52,7,7,7,42,-47,7,7,-56,-55,-54,7,-43,7,7,7,7,7,7,7,7,7,7,7,-56,-48,-49,7,7,7,7,-53,7,7,-50,7,-61,7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,-44,-46,-45,-51,-59,-41,-42,42,42,-60,7,-58,-57,]),',':([1,2,3,4,8,9,10,11,12,13,15,20,21,24,37,39,40,45,48,50,51,52,68,69,70,71,72,73,74,75,76,77,78,79,80,81,82,83,84,85,86,87,88,95,96,104,106,107,],[-22,-18,-40,-52,-37,-35,-47,-33,-31,-20,-24,-55,-54,-43,-56,-48,-49,-53,-50,-61,89,-63,-23,-28,-26,-30,-29,-25,-27,-21,-44,-46,-45,-51,-59,-41,-42,-39,-38,-36,-34,-32,-60,-58,89,-19,-62,-57,]),'/':([3,4,10,17,20,21,24,37,39,40,45,48,50,76,77,78,79,80,81,82,88,95,107,],[35,-52,-47,-56,-55,-54,-43,-56,-48,-49,-53,-50,-61,-44,-46,-45,-51,-59,35,35,-60,-58,-57,]),'MINUSEQ':([17,],[62,]),';':([0,1,2,3,4,8,9,10,11,12,13,15,17,19,20,21,22,24,25,37,39,40,45,48,50,67,68,69,70,71,72,73,74,75,76,77,78,79,80,81,82,83,84,85,86,87,88,90,91,92,93,94,95,97,98,99,100,101,102,103,104,107,],[-4,-22,-18,-40,-52,-37,-35,-47,-33,-31,-20,-24,-56,-5,-55,-54,67,-43,-3,-56,-48,-49,-53,-50,-61,-4,-23,-28,-26,-30,-29,-25,-27,-21,-44,-46,-45,-51,-59,-41,-42,-39,-38,-36,-34,-32,-60,-11,-8,-10,-14,-12,-58,-16,-7,-9,-13,-17,-6,-15,-19,-57,]),'=':([17,],[64,]),'<':([1,3,4,8,9,10,11,12,15,17,20,21,24,37,39,40,45,48,50,69,70,71,72,73,74,76,77,78,79,80,81,82,83,84,85,86,87,88,95,107,],[30,-40,-52,-37,-35,-47,-33,-31,-24,-56,-55,-54,-43,-56,-48,-49,-53,-50,-61,-28,-26,-30,-29,-25,-27,-44,-46,-45,-51,-59,-41,-42,-39,-38,-36,-34,-32,-60,-58,-57,]),'OREQ':([17,],[60,]),'$end':([0,1,2,3,4,8,9,10,11,12,13,15,17,18,19,20,21,22,24,25,37,39,40,45,48,50,67,68,69,70,71,72,73,74,75,76,77,78,79,80,81,82,83,84,85,86,87,88,90,91,92,93,94,95,97,98,99,100,101,102,103,104,105,107,],[-4,-22,-18,-40,-52,-37,-35,-47,-33,-31,-20,-24,-56,0,-5,-55,-54,-1,-43,-3,-56,-48,-49,-53,-50,-61,-4,-23,-28,-26,-30,-29,-25,-27,-21,-44,-46,-45,-51,-59,-41,-42,-39,-38,-36,-34,-32,-60,-11,-8,-10,-14,-12,-58,-16,-7,-9,-13,-17,-6,-15,-19,-2,-57,]),'LSHIFTEQ':([17,],[55,]),'TIMESEQ':([17,],[56,]),'MODEQ':([17,],[59,]),'XOREQ':([17,],[54,]),'[':([0,5,6,7,14,16,23,26,27,28,29,30,31,32,33,34,35,36,41,42,43,44,46,47,49,53,54,55,56,57,58,59,60,61,62,63,64,65,66,67,89,],[16,16,16,16,16,16,16,16,16,16,16,16,16,16,16,16,16,16,16,16,16,16,16,16,16,16,16,16,16,16,16,16,16,16,16,16,16,16,16,16,16,]),']':([1,2,3,4,8,9,10,11,12,13,15,16,20,21,24,37,39,40,45,48,50,51,52,68,69,70,71,72,73,74,75,76,77,78,79,80,81,82,83,84,85,86,87,88,95,104,106,107,],[-22,-18,-40,-52,-37,-35,-47,-33,-31,-20,-24,50,-55,-54,-43,-56,-48,-49,-53,-50,-61,88,-63,-23,-28,-26,-30,-29,-25,-27,-21,-44,-46,-45,-51,-59,-41,-42,-39,-38,-36,-34,-32,-60,-58,-19,-62,-57,]),'ID':([0,5,6,7,14,16,23,26,27,28,29,30,31,32,33,34,35,36,41,42,43,44,46,47,49,53,54,55,56,57,58,59,60,61,62,63,64,65,66,67,89,],[17,37,37,37,37,37,37,37,37,37,37,37,37,37,37,37,37,37,37,37,37,37,37,37,37,17,17,17,17,17,37,17,17,17,17,17,17,17,37,17,37,]),'^':([3,4,8,9,10,11,12,17,20,21,24,37,39,40,45,48,50,76,77,78,79,80,81,82,83,84,85,86,87,88,95,107,],[-40,-52,-37,-35,-47,-33,47,-56,-55,-54,-43,-56,-48,-49,-53,-50,-61,-44,-46,-45,-51,-59,-41,-42,-39,-38,-36,-34,47,-60,-58,-57,]),'AND':([1,2,3,4,8,9,10,11,12,13,15,17,20,21,24,37,39,40,45,48,50,68,69,70,71,72,73,74,75,76,77,78,79,80,81,82,83,84,85,86,87,88,95,104,107,],[-22,32,-40,-52,-37,-35,-47,-33,-31,-20,-24,-56,-55,-54,-43,-56,-48,-49,-53,-50,-61,-23,-28,-26,-30,-29,-25,-27,-21,-44,-46,-45,-51,-59,-41,-42,-39,-38,-36,-34,-32,-60,-58,32,-57,]),'RSHIFTEQ':([17,],[53,]),'EQ':([1,3,4,8,9,10,11,12,15,17,20,21,24,37,39,40,45,48,50,69,70,71,72,73,74,76,77,78,79,80,81,82,83,84,85,86,87,88,95,107,],[29,-40,-52,-37,-35,-47,-33,-31,-24,-56,-55,-54,-43,-56,-48,-49,-53,-50,-61,-28,-26,-30,-29,-25,-27,-44,-46,-45,-51,-59,-41,-42,-39,-38,-36,-34,-32,-60,-58,-57,]),'INT':([0,5,6,7,14,16,23,26,27,28,29,30,31,32,33,34,35,36,41,42,43,44,46,47,49,53,54,55,56,57,58,59,60,61,62,63,64,65,66,67,89,],[21,21,21,21,21,21,21,21,21,21,21,21,21,21,21,21,21,21,21,21,21,21,21,21,21,21,21,21,21,21,21,21,21,21,21,21,21,21,21,21,21,]),'LTEQ':([1,3,4,8,9,10,11,12,15,17,20,21,24,37,39,40,45,48,50,69,70,71,72,73,74,76,77,78,79,80,81,82,83,84,85,86,87,88,95,107,],[27,-40,-52,-37,-35,-47,-33,-31,-24,-56,-55,-54,-43,-56,-48,-49,-53,-50,-61,-28,-26,-30,-29,-25,-27,-44,-46,-45,-51,-59,-41,-42,-39,-38,-36,-34,-32,-60,-58,-57,]),'FLOAT':([0,5,6,7,14,16,23,26,27,28,29,30,31,32,33,34,35,36,41,42,43,44,46,47,49,53,54,55,56,57,58,59,60,61,62,63,64,65,66,67,89,],[20,20,20,20,20,20,20,20,20,20,20,20,20,20,20,20,20,20,20,20,20,20,20,20,20,20,20,20,20,20,20,20,20,20,20,20,20,20,20,20,20,]),'|':([3,4,8,9,10,11,12,15,17,20,21,24,37,39,40,45,48,50,69,70,71,72,73,74,76,77,78,79,80,81,82,83,84,85,86,87,88,95,107,],[-40,-52,-37,-35,-47,-33,-31,49,-56,-55,-54,-43,-56,-48,-49,-53,-50,-61,49,49,49,49,49,49,-44,-46,-45,-51,-59,-41,-42,-39,-38,-36,-34,-32,-60,-58,-57,]),'PLUSEQ':([17,],[57,]),'DIVEQ':([17,],[65,]),'NOT':([0,5,16,23,32,53,54,55,56,57,58,59,60,61,62,63,64,65,66,67,89,],[23,23,23,23,23,23,23,23,23,23,23,23,23,23,23,23,23,23,23,23,23,]),'EXPEQ':([17,],[63,]),'>':([1,3,4,8,9,10,11,12,15,17,20,21,24,37,39,40,45,48,50,69,70,71,72,73,74,76,77,78,79,80,81,82,83,84,85,86,87,88,95,107,],[31,-40,-52,-37,-35,-47,-33,-31,-24,-56,-55,-54,-43,-56,-48,-49,-53,-50,-61,-28,-26,-30,-29,-25,-27,-44,-46,-45,-51,-59,-41,-42,-39,-38,-36,-34,-32,-60,-58,-57,]),'OR':([1,2,3,4,8,9,10,11,12,13,15,17,19,20,21,24,37,38,39,40,45,48,50,52,68,69,70,71,72,73,74,75,76,77,78,79,80,81,82,83,84,85,86,87,88,95,104,106,107,],[-22,-18,-40,-52,-37,-35,-47,-33,-31,-20,-24,-56,66,-55,-54,-43,-56,66,-48,-49,-53,-50,-61,66,-23,-28,-26,-30,-29,-25,-27,-21,-44,-46,-45,-51,-59,-41,-42,-39,-38,-36,-34,-32,-60,-58,-19,66,-57,]),'~':([0,5,6,7,14,16,23,26,27,28,29,30,31,32,33,34,35,36,41,42,43,44,46,47,49,53,54,55,56,57,58,59,60,61,62,63,64,65,66,67,89,],[14,14,14,14,14,14,14,14,14,14,14,14,14,14,14,14,14,14,14,14,14,14,14,14,14,14,14,14,14,14,14,14,14,14,14,14,14,14,14,14,14,]),}
+
+_lr_action = {}
+for _k, _v in _lr_action_items.items():
+   for _x,_y in zip(_v[0],_v[1]):
+      if not _x in _lr_action:  _lr_action[_x] = {}
+      _lr_action[_x][_k] = _y
+del _lr_action_items
+
+_lr_goto_items = {'commands':([0,67,],[18,105,]),'addt':([0,5,16,23,26,27,28,29,30,31,32,41,42,43,44,46,47,49,53,54,55,56,57,58,59,60,61,62,63,64,65,66,67,89,],[3,3,3,3,3,3,3,3,3,3,3,81,82,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,]),'xort':([0,5,16,23,26,27,28,29,30,31,32,47,49,53,54,55,56,57,58,59,60,61,62,63,64,65,66,67,89,],[11,11,11,11,11,11,11,11,11,11,11,86,11,11,11,11,11,11,11,11,11,11,11,11,11,11,11,11,11,]),'val':([0,5,6,7,14,16,23,26,27,28,29,30,31,32,33,34,35,36,41,42,43,44,46,47,49,53,54,55,56,57,58,59,60,61,62,63,64,65,66,67,89,],[4,4,4,4,4,4,4,4,4,4,4,4,4,4,4,4,4,4,4,4,4,4,4,4,4,4,4,4,4,4,4,4,4,4,4,4,4,4,4,4,4,]),'expr':([0,5,16,53,54,55,56,57,58,59,60,61,62,63,64,65,67,89,],[19,38,52,19,19,19,19,19,52,19,19,19,19,19,19,19,19,106,]),'ort':([0,5,16,23,26,27,28,29,30,31,32,49,53,54,55,56,57,58,59,60,61,62,63,64,65,66,67,89,],[12,12,12,12,12,12,12,12,12,12,12,87,12,12,12,12,12,12,12,12,12,12,12,12,12,12,12,12,]),'bort':([0,5,16,53,54,55,56,57,58,59,60,61,62,63,64,65,66,67,89,],[2,2,2,2,2,2,2,2,2,2,2,2,2,2,2,2,104,2,2,]),'args':([16,58,],[51,96,]),'bnott':([0,5,16,23,32,53,54,55,56,57,58,59,60,61,62,63,64,65,66,67,89,],[1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,]),'bandt':([0,5,16,23,32,53,54,55,56,57,58,59,60,61,62,63,64,65,66,67,89,],[13,13,13,68,75,13,13,13,13,13,13,13,13,13,13,13,13,13,13,13,13,]),'command':([0,67,],[22,22,]),'shiftt':([0,5,16,23,26,27,28,29,30,31,32,43,44,46,47,49,53,54,55,56,57,58,59,60,61,62,63,64,65,66,67,89,],[8,8,8,8,8,8,8,8,8,8,8,83,84,8,8,8,8,8,8,8,8,8,8,8,8,8,8,8,8,8,8,8,]),'compt':([0,5,16,23,26,27,28,29,30,31,32,53,54,55,56,57,58,59,60,61,62,63,64,65,66,67,89,],[15,15,15,15,69,70,71,72,73,74,15,15,15,15,15,15,15,15,15,15,15,15,15,15,15,15,15,]),'andt':([0,5,16,23,26,27,28,29,30,31,32,46,47,49,53,54,55,56,57,58,59,60,61,62,63,64,65,66,67,89,],[9,9,9,9,9,9,9,9,9,9,9,85,9,9,9,9,9,9,9,9,9,9,9,9,9,9,9,9,9,9,]),'factt':([0,5,6,7,14,16,23,26,27,28,29,30,31,32,33,34,35,36,41,42,43,44,46,47,49,53,54,55,56,57,58,59,60,61,62,63,64,65,66,67,89,],[10,10,10,10,10,10,10,10,10,10,10,10,10,10,10,10,10,10,10,10,10,10,10,10,10,10,10,10,10,10,10,10,10,10,10,10,10,10,10,10,10,]),'assign':([0,53,54,55,56,57,59,60,61,62,63,64,65,67,],[25,90,91,92,93,94,97,98,99,100,101,102,103,25,]),'multt':([0,5,6,7,14,16,23,26,27,28,29,30,31,32,33,34,35,36,41,42,43,44,46,47,49,53,54,55,56,57,58,59,60,61,62,63,64,65,66,67,89,],[24,24,39,40,48,24,24,24,24,24,24,24,24,24,76,77,78,79,24,24,24,24,24,24,24,24,24,24,24,24,24,24,24,24,24,24,24,24,24,24,24,]),}
+
+_lr_goto = {}
+for _k, _v in _lr_goto_items.items():
+   for _x, _y in zip(_v[0], _v[1]):
+       if not _x in _lr_goto: _lr_goto[_x] = {}
+       _lr_goto[_x][_k] = _y
+del _lr_goto_items
+_lr_productions = [
+  ("S' -> commands","S'",1,None,None,None),
+  ('commands -> command','commands',1,'p_commands','calc.py',222),
+  ('commands -> command ; commands','commands',3,'p_commands_more','calc.py',225),
+  ('command -> assign','command',1,'p_command','calc.py',229),
+  ('command -> <empty>','command',0,'p_command_blank','calc.py',232),
+  ('assign -> expr','assign',1,'p_assign','calc.py',238),
+  ('assign -> ID = assign','assign',3,'p_assign_eq','calc.py',241),
+  ('assign -> ID OREQ assign','assign',3,'p_assign_oreq','calc.py',244),
+  ('assign -> ID XOREQ assign','assign',3,'p_assign_xoreq','calc.py',247),
+  ('assign -> ID ANDEQ assign','assign',3,'p_assign_andeq','calc.py',250),
+  ('assign -> ID LSHIFTEQ assign','assign',3,'p_assign_lshifteq','calc.py',253),
+  ('assign -> ID RSHIFTEQ assign','assign',3,'p_assign_rshifteq','calc.py',256),
+  ('assign -> ID PLUSEQ assign','assign',3,'p_assign_pluseq','calc.py',259),
+  ('assign -> ID MINUSEQ assign','assign',3,'p_assign_minuseq','calc.py',262),
+  ('assign -> ID TIMESEQ assign','assign',3,'p_assign_timeseq','calc.py',265),
+  ('assign -> ID DIVEQ assign','assign',3,'p_assign_diveq','calc.py',268),
+  ('assign -> ID MODEQ assign','assign',3,'p_assign_modeq','calc.py',271),
+  ('assign -> ID EXPEQ assign','assign',3,'p_assign_expeq','calc.py',274),
+  ('expr -> bort','expr',1,'p_expr','calc.py',278),
+  ('expr -> expr OR bort','expr',3,'p_expr_bor','calc.py',281),
+  ('bort -> bandt','bort',1,'p_bort','calc.py',285),
+  ('bort -> bort AND bandt','bort',3,'p_bort_band','calc.py',288),
+  ('bandt -> bnott','bandt',1,'p_bandt','calc.py',292),
+  ('bandt -> NOT bandt','bandt',2,'p_bandt_bnot','calc.py',295),
+  ('bnott -> compt','bnott',1,'p_bnott','calc.py',299),
+  ('bnott -> bnott < compt','bnott',3,'p_bnott_lt','calc.py',302),
+  ('bnott -> bnott LTEQ compt','bnott',3,'p_bnott_lteq','calc.py',305),
+  ('bnott -> bnott > compt','bnott',3,'p_bnott_gt','calc.py',308),
+  ('bnott -> bnott GTEQ compt','bnott',3,'p_bnott_gteq','calc.py',311),
+  ('bnott -> bnott EQ compt','bnott',3,'p_bnott_eq','calc.py',314),
+  ('bnott -> bnott NEQ compt','bnott',3,'p_bnott_neq','calc.py',317),
+  ('compt -> ort','compt',1,'p_compt','calc.py',321),
+  ('compt -> compt | ort','compt',3,'p_compt_or','calc.py',324),
+  ('ort -> xort','ort',1,'p_ort','calc.py',328),
+  ('ort -> ort ^ xort','ort',3,'p_ort_xor','calc.py',331),
+  ('xort -> andt','xort',1,'p_xort','calc.py',335),
+  ('xort -> xort & andt','xort',3,'p_xort_and','calc.py',338),
+  ('andt -> shiftt','andt',1,'p_andt','calc.py',342),
+  ('andt -> andt LSHIFT shiftt','andt',3,'p_andt_lshift','calc.py',345),
+  ('andt -> andt RSHIFT shiftt','andt',3,'p_andt_rshift','calc.py',348),
+  ('shiftt -> addt','shiftt',1,'p_shiftt','calc.py',352),
+  ('shiftt -> shiftt + addt','shiftt',3,'p_shiftt_add','calc.py',355),
+  ('shiftt -> shiftt - addt','shiftt',3,'p_shiftt_sub','calc.py',358),
+  ('addt -> multt','addt',1,'p_addt','calc.py',362),
+  ('addt -> addt * multt','addt',3,'p_addt_mult','calc.py',365),
+  ('addt -> addt / multt','addt',3,'p_addt_div','calc.py',368),
+  ('addt -> addt % multt','addt',3,'p_addt_mod','calc.py',371),
+  ('multt -> factt','multt',1,'p_multt','calc.py',375),
+  ('multt -> + multt','multt',2,'p_multt_pos','calc.py',378),
+  ('multt -> - multt','multt',2,'p_multt_neg','calc.py',381),
+  ('multt -> ~ multt','multt',2,'p_multt_not','calc.py',384),
+  ('multt -> val EXP multt','multt',3,'p_multt_exp','calc.py',387),
+  ('factt -> val','factt',1,'p_factt','calc.py',391),
+  ('factt -> factt !','factt',2,'p_factt_fact','calc.py',394),
+  ('val -> INT','val',1,'p_val_int','calc.py',398),
+  ('val -> FLOAT','val',1,'p_val_float','calc.py',401),
+  ('val -> ID','val',1,'p_val_id','calc.py',404),
+  ('val -> ID ( args )','val',4,'p_val_func','calc.py',407),
+  ('val -> ID ( )','val',3,'p_val_func_empty','calc.py',410),
+  ('val -> ( expr )','val',3,'p_val_expr','calc.py',413),
+  ('val -> [ args ]','val',3,'p_val_list','calc.py',416),
+  ('val -> [ ]','val',2,'p_val_list_empty','calc.py',419),
+  ('args -> args , expr','args',3,'p_args_args','calc.py',423),
+  ('args -> expr','args',1,'p_args_expr','calc.py',426),
+]
@@ -0,0 +1,47 @@
+"""channels.py - State kept separately for each channel the bot is in"""
+
+import collections
+
+
+# nicks every channel starts out ignoring
+DEFAULT_IGNORED = ('volbot', 'stuessbot')
+
+
+class ChannelState(object):
+    """Settings and models for one channel.
+
+    volify is the channel's markov model (usually a LazyObject, so it is
+    only read from the db when needed).
+    """
+
+    def __init__(self, name, volify):
+        self.name = name
+        self.volify = volify
+        self.ignored = set(DEFAULT_IGNORED)
+        self.translate_settings = collections.defaultdict(lambda: "off")
+
+
+class Channels(object):
+    """The ChannelStates for a bot's channels, looked up case-insensitively"""
+
+    def __init__(self, names, volify_factory):
+        self.names = list(names)
+        self._states = collections.OrderedDict(
+            (name.lower(), ChannelState(name, volify_factory(name))) for name in self.names)
+
+    def get(self, target):
+        """Return the state for target, or None if it isn't one of our channels"""
+        return self._states.get(target.lower())
+
+    def for_target(self, target):
+        """Return the states a command sent to target applies to: the channel's
+        own, or every channel's for a private message"""
+        state = self.get(target)
+        return [state] if state is not None else self._states.values()
+
+    def default(self, target):
+        """Return the state for target, or the first channel's for a private message"""
+        return self.get(target) or next(self._states.itervalues())
+
+    def __iter__(self):
+        return self._states.itervalues()
@@ -0,0 +1,86 @@
+"""corpus.py - Phrase lists from extra/, loaded once and reloaded when the file changes"""
+
+import io
+import os
+import random
+import threading
+import time
+
+
+EXTRA = os.path.join(os.path.dirname(__file__), 'extra')
+
+
+def read(path):
+    """Read a corpus file: one UTF-8 phrase per line"""
+    with io.open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def write(path, phrases):
+    """Write phrases to a corpus file, sorted and without duplicates"""
+    phrases = (p if isinstance(p, unicode) else p.decode('utf-8') for p in phrases)
+    tmp = path + '.tmp'
+    with io.open(tmp, 'w', encoding='utf-8') as f:
+        for phrase in sorted(set(p.strip() for p in phrases if p.strip())):
+            f.write(phrase + u'\n')
+    os.rename(tmp, path)
+
+
+class Corpus(object):
+    """The phrases in one corpus file.
+
+    The file is read on first use and read again only when its mtime
+    changes (checked at most every check_interval seconds).  Phrases are
+    kept in a tuple so a random one can be picked in constant time.
+    """
+
+    def __init__(self, path, check_interval=1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.phrases = ()
+        self.loads = 0
+
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked = 0
+
+    def _refresh(self):
+        now = time.time()
+        if now - self._checked < self.check_interval:
+            return
+        with self._lock:
+            self._checked = now
+            mtime = os.stat(self.path).st_mtime
+            if mtime != self._mtime:
+                self.phrases = tuple(read(self.path))
+                self._mtime = mtime
+                self.loads += 1
+
+    def choice(self):
+        """Return a random phrase"""
+        self._refresh()
+        return random.choice(self.phrases)
+
+    def __len__(self):
+        self._refresh()
+        return len(self.phrases)
+
+
+class Corpora(object):
+    """Corpus files in a directory, by name"""
+
+    def __init__(self, directory=EXTRA):
+        self.directory = directory
+        self._corpora = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name):
+        with self._lock:
+            corpus = self._corpora.get(name)
+            if corpus is None:
+                corpus = self._corpora[name] = Corpus(os.path.join(self.directory, name))
+            return corpus
+
+    def __str__(self):
+        return ' '.join("%s=%d phrases/%d loads" % (name, len(c.phrases), c.loads)
+                        for name, c in sorted(self._corpora.items())) or 'none loaded'
@@ -0,0 +1,145 @@
+"""dice.py - Dice notation parser and a roller that scales to huge numbers of dice"""
+
+import math
+import random
+import re
+
+from .utils import lazy_import
+
+np = lazy_import('numpy')
+
+
+# limits on notation
+MAX_DICE = 10**15
+MAX_SIDES = 10**15
+MAX_MODIFIER = 10**15
+MAX_TERMS = 20
+
+# up to this many dice are sampled individually (in batches of BATCH)
+SAMPLE_LIMIT = 10**6
+BATCH = 2**16
+
+# beyond SAMPLE_LIMIT, dice with at most this many sides are rolled exactly by
+# sampling how many times each face comes up; more sides than that fall back
+# to a normal approximation of the sum
+FACE_LIMIT = 10**5
+
+_term = re.compile(r'([+-]?)(?:(\d*)d(\d+)(?:k([hl]?)(\d+))?|(\d+))')
+
+
+class DiceError(Exception):
+    """Bad or oversized dice notation"""
+    pass
+
+
+class Dice(object):
+    """count dice with sides sides, optionally keeping only the keep highest
+    (or lowest, if lowest) of them"""
+
+    def __init__(self, count, sides, keep=None, lowest=False):
+        self.count = count
+        self.sides = sides
+        self.keep = count if keep is None else min(keep, count)
+        self.lowest = lowest
+
+    def roll(self):
+        """Return the sum of a roll of these dice (of the kept ones)"""
+        if self.keep == 0:
+            return 0
+        if self.count <= SAMPLE_LIMIT:
+            return self._sample()
+        if self.sides <= FACE_LIMIT:
+            return self._faces()
+        if self.keep < self.count:
+            raise DiceError("Too many dice to keep: %dd%d" % (self.count, self.sides))
+        return self._normal()
+
+    def _sample(self):
+        """Roll each die, BATCH at a time"""
+        if self.keep < self.count:
+            rolls = np.random.randint(1, self.sides + 1, size=self.count)
+            if self.lowest:
+                kept = np.partition(rolls, self.keep - 1)[:self.keep]
+            else:
+                kept = np.partition(rolls, self.count - self.keep)[self.count - self.keep:]
+            if self.keep * self.sides >= 2**63:
+                kept = kept.astype(object)
+            return int(kept.sum())
+
+        # keep each batch's sum well inside an int64
+        batch = max(1, min(BATCH, 2**62 // self.sides))
+        total = 0
+        for start in xrange(0, self.count, batch):
+            size = min(batch, self.count - start)
+            total += int(np.random.randint(1, self.sides + 1, size=size).sum())
+        return total
+
+    def _faces(self):
+        """Sample how many dice show each face (exact, and O(sides))"""
+        counts = np.random.multinomial(self.count, [1.0 / self.sides] * self.sides)
+        if self.keep < self.count:
+            if not self.lowest:
+                counts = counts[::-1]
+            kept = np.minimum(counts, np.maximum(self.keep - (np.cumsum(counts) - counts), 0))
+            counts = kept if self.lowest else kept[::-1]
+
+        faces = np.arange(1, self.sides + 1)
+        if self.count * self.sides >= 2**63:
+            return int(np.dot(counts.astype(object), faces.astype(object)))
+        return int(np.dot(counts, faces))
+
+    def _normal(self):
+        """Approximate the sum with a normal distribution (count is huge, so
+        the error is negligible), clamped to the possible range"""
+        sigma = math.sqrt(self.count * (self.sides ** 2 - 1) / 12.0)
+        twice_mean = self.count * (self.sides + 1)
+        total = twice_mean // 2 + int(round(random.gauss(0, sigma) + (twice_mean % 2) / 2.0))
+        return min(max(total, self.count), self.count * self.sides)
+
+
+def parse(notation):
+    """Parse dice notation into a list of (sign, Dice or int) terms.
+
+    Terms look like 3d6, d20, 4d6kh3 (keep the 3 highest), 2d20kl1 (keep
+    the lowest) or a plain number, joined with + or -.
+    """
+    notation = re.sub(r'\s*([+-])\s*', r'\1', notation.strip().lower())
+    if not notation:
+        raise DiceError("No dice to roll.")
+
+    terms = []
+    pos = 0
+    while pos < len(notation):
+        match = _term.match(notation, pos)
+        if match is None or (pos > 0 and not match.group(1)):
+            raise DiceError("Bad dice notation at '%s'" % notation[pos:])
+        pos = match.end()
+
+        sign, count, sides, keep_which, keep, number = match.groups()
+        sign = -1 if sign == '-' else 1
+        if number is not None:
+            if int(number) > MAX_MODIFIER:
+                raise DiceError("Modifier too large: %s" % number)
+            terms.append((sign, int(number)))
+            continue
+
+        count = int(count) if count else 1
+        sides = int(sides)
+        if count > MAX_DICE:
+            raise DiceError("Too many dice: %d" % count)
+        if not 1 <= sides <= MAX_SIDES:
+            raise DiceError("Bad number of sides: %d" % sides)
+        keep = int(keep) if keep is not None else None
+        terms.append((sign, Dice(count, sides, keep, keep_which == 'l')))
+
+    if len(terms) > MAX_TERMS:
+        raise DiceError("Too many terms: %d" % len(terms))
+    return terms
+
+
+def roll(notation):
+    """Roll dice notation and return the total"""
+    total = 0
+    for sign, term in parse(notation):
+        total += sign * (term.roll() if isinstance(term, Dice) else term)
+    return total
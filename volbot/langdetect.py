@@ -0,0 +1,35 @@
+"""langdetect.py - Lazily loaded, cached language identification"""
+
+import hashlib
+import threading
+
+from .cache import TTLCache
+
+
+class LanguageDetector(object):
+    """Classify messages with langid, restricted to a set of candidate languages.
+
+    The langid model is only loaded the first time it is needed, and
+    results are cached by a hash of the message.
+    """
+
+    def __init__(self, languages, cache_size=4096):
+        self.languages = list(languages)
+        self.cache = TTLCache(maxsize=cache_size, ttl=0)
+        self._identifier = None
+        self._lock = threading.Lock()
+
+    def identifier(self):
+        """Return the langid identifier, loading the model on first use"""
+        with self._lock:
+            if self._identifier is None:
+                from langid.langid import LanguageIdentifier, model
+                identifier = LanguageIdentifier.from_modelstring(model)
+                identifier.set_languages(self.languages)
+                self._identifier = identifier
+            return self._identifier
+
+    def classify(self, msg):
+        """Return the most likely language code for msg"""
+        key = hashlib.md5(msg.encode('utf-8')).digest()
+        return self.cache.fetch(key, lambda: self.identifier().classify(msg)[0])
@@ -0,0 +1,125 @@
+"""logwriter.py - Write-behind batching of message logs to MongoDB"""
+
+import Queue
+import threading
+import time
+import traceback
+
+
+class Flush(object):
+    """Marker queued by flush(); done is set once everything queued before it
+    has been written"""
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class LogWriter(object):
+    """Buffer documents in memory and insert them into a collection in batches.
+
+    A background thread flushes the buffer with insert_many whenever it
+    holds batch_size documents or interval seconds have passed.  When the
+    queue is full, write() blocks for at most block seconds and then drops
+    the document, so a slow database never stalls the caller for long.
+    If given, on_write(batch) is called on the writer thread after each
+    successful insert.
+    """
+
+    def __init__(self, collection, batch_size=100, interval=1.0, maxsize=10000, block=0.05, on_write=None):
+        self.collection = collection
+        self.on_write = on_write
+        self.batch_size = batch_size
+        self.interval = interval
+        self.block = block
+        self.queue = Queue.Queue(maxsize)
+
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="volbot-logwriter")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def write(self, doc):
+        """Queue a document for insertion; return False if it was dropped"""
+        if self._closed:
+            self.dropped += 1
+            return False
+        try:
+            self.queue.put(doc, timeout=self.block)
+            return True
+        except Queue.Full:
+            self.dropped += 1
+            return False
+
+    def pending(self):
+        """Return the number of documents waiting to be written"""
+        return self.queue.qsize()
+
+    def flush(self, timeout=10.0):
+        """Wait until everything queued so far has been written.
+
+        Documents queued after the call aren't waited for, and the batch
+        being collected is written right away instead of after interval.
+        """
+        if self._closed:
+            return
+        marker = Flush()
+        deadline = time.time() + timeout
+        try:
+            self.queue.put(marker, timeout=timeout)
+        except Queue.Full:
+            return
+        marker.done.wait(max(0, deadline - time.time()))
+
+    def close(self, timeout=10.0):
+        """Flush the queue and stop the writer thread"""
+        self._closed = True
+        self._thread.join(timeout)
+
+    def _take_batch(self):
+        """Block until a batch is ready (or the interval passes, or a flush is
+        asked for) and return it, with the Flush markers it ends with"""
+        batch = []
+        flushes = []
+        deadline = time.time() + self.interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=remaining)
+            except Queue.Empty:
+                break
+            if isinstance(item, Flush):
+                flushes.append(item)
+                break
+            batch.append(item)
+        return batch, flushes
+
+    def _run(self):
+        while True:
+            closing = self._closed
+            batch, flushes = self._take_batch()
+            if batch:
+                try:
+                    self.collection.insert_many(batch, ordered=False)
+                    self.written += len(batch)
+                    if self.on_write is not None:
+                        self.on_write(batch)
+                except Exception:
+                    self.failed += len(batch)
+                    traceback.print_exc()
+                for _ in batch:
+                    self.queue.task_done()
+            for marker in flushes:
+                marker.done.set()
+                self.queue.task_done()
+            if closing and self.queue.empty():
+                return
+
+    def __str__(self):
+        return "written=%d pending=%d dropped=%d failed=%d" % (
+            self.written, self.pending(), self.dropped, self.failed)
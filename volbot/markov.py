@@ -0,0 +1,211 @@
+"""markov.py - Markov text models that can be saved, loaded and updated in place"""
+
+import collections
+import hashlib
+import json
+import marshal
+import mmap
+import os
+import threading
+
+import markovify
+from markovify.chain import BEGIN, END
+
+
+# first line of a compiled model file
+MAGIC = 'VOLBOT-MARKOV 1\n'
+
+
+class Chain(markovify.Chain):
+    """markovify.Chain whose transition counts can be changed after it is built"""
+
+    def __init__(self, state_size, model=None):
+        self.state_size = state_size
+        self.model = model if model is not None else {}
+
+    def add_run(self, run, weight=1):
+        """Add (or, with a negative weight, remove) the transitions of a run"""
+        items = [BEGIN] * self.state_size + run + [END]
+        for i in xrange(len(run) + 1):
+            state = tuple(items[i:i + self.state_size])
+            follow = items[i + self.state_size]
+            follows = self.model.setdefault(state, {})
+            count = follows.get(follow, 0) + weight
+            if count > 0:
+                follows[follow] = count
+            else:
+                follows.pop(follow, None)
+                if not follows:
+                    del self.model[state]
+
+
+class MarkovText(markovify.Text):
+    """markovify.Text that can be grown incrementally and saved to disk"""
+
+    def __init__(self, input_text=None, state_size=2):
+        self.state_size = state_size
+        self.chain = Chain(state_size)
+        self.sentences = collections.Counter()  # rejoined sentence -> count
+        self._rejoined = None
+        self.lock = threading.RLock()
+        if input_text:
+            self.add_text(input_text)
+
+    @property
+    def rejoined_text(self):
+        """The whole corpus, used to reject sentences copied from it"""
+        with self.lock:
+            if self._rejoined is None:
+                self._rejoined = self.sentence_join(self.sentences.elements())
+            return self._rejoined
+
+    def add_text(self, text, weight=1):
+        """Add the sentences in text to the model"""
+        runs = self.generate_corpus(text)
+        with self.lock:
+            for run in runs:
+                self.chain.add_run(run, weight)
+                sentence = self.word_join(run)
+                self.sentences[sentence] += weight
+                if self.sentences[sentence] <= 0:
+                    del self.sentences[sentence]
+            self._rejoined = None
+
+    def make_sentence(self, **kwargs):
+        with self.lock:
+            return markovify.Text.make_sentence(self, **kwargs)
+
+    def save(self, path, source_hash=None):
+        """Write the compiled model to path"""
+        header = {'state_size': self.state_size, 'source_sha1': source_hash}
+        with self.lock:
+            body = marshal.dumps((dict(self.sentences), interned(self.chain.model)))
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(MAGIC)
+            f.write(json.dumps(header) + '\n')
+            f.write(body)
+        os.rename(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        """Read a compiled model; return (model, source hash)"""
+        with open(path, 'rb') as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                if buf.readline() != MAGIC:
+                    raise ValueError("%s is not a compiled markov model" % path)
+                header = json.loads(buf.readline())
+                sentences, model = marshal.loads(buf[buf.tell():])
+            finally:
+                buf.close()
+
+        text = cls(state_size=header['state_size'])
+        text.sentences.update(sentences)
+        text.chain.model = model
+        return text, header['source_sha1']
+
+
+class WindowText(MarkovText):
+    """MarkovText over the most recent size messages.
+
+    Each appended message is added to the chain as it arrives, and the
+    oldest message's transitions are removed again once it falls out of
+    the window, so the model never needs rebuilding.
+    """
+
+    def __init__(self, messages=(), size=10000, state_size=2):
+        MarkovText.__init__(self, state_size=state_size)
+        self.size = size
+        self.window = collections.deque()
+        for msg in messages:
+            self.append(msg)
+
+    def __len__(self):
+        return len(self.window)
+
+    def append(self, msg):
+        """Add a message, dropping the oldest one if the window is full"""
+        with self.lock:
+            self.window.append(msg)
+            self.add_text(as_sentence(msg))
+            if len(self.window) > self.size:
+                self.add_text(as_sentence(self.window.popleft()), -1)
+
+    def drift(self, other):
+        """Return how many chain states differ from another model's"""
+        with self.lock:
+            mine, theirs = self.chain.model, other.chain.model
+            return sum(1 for state in set(mine) | set(theirs)
+                       if mine.get(state) != theirs.get(state))
+
+
+def as_sentence(msg):
+    """Terminate a chat message so it splits as a sentence of its own"""
+    msg = msg.strip()
+    if msg and msg[-1] not in '.?!':
+        msg += '.'
+    return msg
+
+
+def interned(model):
+    """Return a copy of a chain model with its byte-string words interned.
+
+    marshal writes an interned string once and back-references every later
+    use, which keeps compiled files small and shares the words in memory
+    once they are loaded again.
+    """
+    def word(w):
+        return intern(w) if type(w) is str else w
+    return dict(
+        (tuple(word(w) for w in state), dict((word(w), n) for w, n in follows.iteritems()))
+        for state, follows in model.iteritems()
+    )
+
+
+def file_hash(path):
+    """Return the SHA1 hex digest of a file's contents"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), ''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def compiled_path(source):
+    """Return where the compiled model for a text file is kept"""
+    return os.path.splitext(source)[0] + '.chain'
+
+
+def compile_text(source, dest=None):
+    """Build a model from a text file and save it next to the file"""
+    with open(source) as f:
+        text = MarkovText(f.read())
+    text.save(dest or compiled_path(source), file_hash(source))
+    return text
+
+
+def load_text(source, dest=None):
+    """Load the compiled model for a text file, rebuilding it if stale.
+
+    The compiled model is rebuilt (and rewritten, if possible) whenever the
+    hash of the source file differs from the one it was compiled from.  If
+    the source file is missing, the compiled model is used as is.
+    """
+    dest = dest or compiled_path(source)
+    current = file_hash(source) if os.path.exists(source) else None
+    try:
+        text, compiled_from = MarkovText.load(dest)
+        if current is None or compiled_from == current:
+            return text
+    except (IOError, ValueError, EOFError):
+        if current is None:
+            raise
+
+    with open(source) as f:
+        text = MarkovText(f.read())
+    try:
+        text.save(dest, current)
+    except (IOError, OSError):
+        pass
+    return text
@@ -0,0 +1,255 @@
+"""metrics.py - Counters and latency histograms, served in Prometheus text format"""
+
+import BaseHTTPServer
+import bisect
+import contextlib
+import threading
+import time
+import traceback
+
+
+# upper bounds (in seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def escape(value):
+    """Escape a label value for the text format"""
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def format_seconds(seconds):
+    """Format a duration briefly, in ms when it is under a second"""
+    if seconds < 1:
+        return "%.1fms" % (seconds * 1000)
+    return "%.2fs" % seconds
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+class Metric(object):
+    """A named family of samples, one series per tuple of label values"""
+
+    kind = 'untyped'
+
+    def __init__(self, name, doc, labels=()):
+        self.name = name
+        self.doc = doc
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._series = {}  # label values -> value
+
+    def _labels(self, values, extra=()):
+        pairs = zip(self.labels, values) + list(extra)
+        if not pairs:
+            return ''
+        return '{%s}' % ','.join('%s="%s"' % (k, escape(v)) for k, v in pairs)
+
+    def samples(self):
+        """Return (name, labels, value) for each sample in the family"""
+        with self._lock:
+            series = sorted(self._series.items())
+        return [(self.name, self._labels(values), value) for values, value in series]
+
+    def render(self):
+        lines = ["# HELP %s %s" % (self.name, self.doc), "# TYPE %s %s" % (self.name, self.kind)]
+        lines.extend("%s%s %s" % (name, labels, format_value(value)) for name, labels, value in self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    """A count that only goes up"""
+
+    kind = 'counter'
+
+    def inc(self, *values):
+        """Add one to the series for the given label values"""
+        with self._lock:
+            self._series[values] = self._series.get(values, 0) + 1
+
+    def get(self, *values):
+        return self._series.get(values, 0)
+
+
+class Gauge(Metric):
+    """A value read (by calling a function) whenever the metrics are rendered.
+
+    Pass kind='counter' to export a running total kept elsewhere, like the
+    counts a WorkerPool keeps.
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name, doc, labels=(), kind='gauge'):
+        Metric.__init__(self, name, doc, labels)
+        self.kind = kind
+
+    def track(self, func, *values):
+        """Report func() as the series for the given label values"""
+        with self._lock:
+            self._series[values] = func
+
+    def samples(self):
+        with self._lock:
+            series = sorted(self._series.items())
+        samples = []
+        for values, func in series:
+            try:
+                samples.append((self.name, self._labels(values), func()))
+            except Exception:
+                traceback.print_exc()
+        return samples
+
+
+class HistogramSeries(object):
+    """Observations for one series of a Histogram"""
+
+    __slots__ = ('counts', 'count', 'sum', 'max')
+
+    def __init__(self, size):
+        self.counts = [0] * size  # per bucket, not cumulative; the last is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+
+class Histogram(Metric):
+    """Observations (usually seconds) counted into fixed buckets"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, doc, labels=(), buckets=LATENCY_BUCKETS):
+        Metric.__init__(self, name, doc, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *values):
+        """Record value in the series for the given label values"""
+        with self._lock:
+            series = self._series.get(values)
+            if series is None:
+                series = self._series[values] = HistogramSeries(len(self.buckets) + 1)
+            series.counts[bisect.bisect_left(self.buckets, value)] += 1
+            series.count += 1
+            series.sum += value
+            series.max = max(series.max, value)
+
+    @contextlib.contextmanager
+    def time(self, *values):
+        """Observe how long the with block takes"""
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.observe(time.time() - start, *values)
+
+    def series(self):
+        """Return (label values, HistogramSeries) pairs, copied under the lock"""
+        with self._lock:
+            return [(values, self._copy(s)) for values, s in sorted(self._series.items())]
+
+    @staticmethod
+    def _copy(series):
+        copy = HistogramSeries(len(series.counts))
+        copy.counts = list(series.counts)
+        copy.count, copy.sum, copy.max = series.count, series.sum, series.max
+        return copy
+
+    def quantile(self, series, q):
+        """Estimate the q-quantile of a series, interpolating within its bucket"""
+        if not series.count:
+            return 0.0
+        rank = q * series.count
+        seen = 0
+        lower = 0.0
+        for upper, count in zip(self.buckets + (series.max,), series.counts):
+            if count and seen + count >= rank:
+                upper = min(upper, series.max)
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = upper
+        return series.max
+
+    def describe(self, series):
+        """Summarize a series in one line: its count and latency percentiles"""
+        return "n=%d p50=%s p95=%s max=%s" % (
+            series.count, format_seconds(self.quantile(series, 0.5)),
+            format_seconds(self.quantile(series, 0.95)), format_seconds(series.max))
+
+    def total(self):
+        """Return all of the series merged into one"""
+        merged = HistogramSeries(len(self.buckets) + 1)
+        for _, series in self.series():
+            merged.counts = [a + b for a, b in zip(merged.counts, series.counts)]
+            merged.count += series.count
+            merged.sum += series.sum
+            merged.max = max(merged.max, series.max)
+        return merged
+
+    def samples(self):
+        samples = []
+        for values, series in self.series():
+            total = 0
+            for upper, count in zip(self.buckets + (float('inf'),), series.counts):
+                total += count
+                samples.append((self.name + '_bucket', self._labels(values, [('le', format_value(upper))]), total))
+            samples.append((self.name + '_sum', self._labels(values), series.sum))
+            samples.append((self.name + '_count', self._labels(values), series.count))
+        return samples
+
+
+class Registry(object):
+    """The metrics a process exports"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, doc, labels=()):
+        return self.add(Counter(name, doc, labels))
+
+    def gauge(self, name, doc, labels=(), kind='gauge'):
+        return self.add(Gauge(name, doc, labels, kind))
+
+    def histogram(self, name, doc, labels=(), buckets=LATENCY_BUCKETS):
+        return self.add(Histogram(name, doc, labels, buckets))
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format"""
+        return ''.join(metric.render() + '\n' for metric in self.metrics)
+
+
+def serve(registry, port, host='127.0.0.1'):
+    """Serve registry's metrics over HTTP from a daemon thread; return the server"""
+
+    class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = registry.render()
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # scrapes would drown out the chat log
+
+    server = BaseHTTPServer.HTTPServer((host, port), Handler)
+    thread = threading.Thread(target=server.serve_forever, name="volbot-metrics")
+    thread.daemon = True
+    thread.start()
+    return server
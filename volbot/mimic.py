@@ -0,0 +1,142 @@
+"""mimic.py - LRU cache of per-nick markov models for !mimic"""
+
+import collections
+import threading
+import warnings
+
+from .utils import lazy_import
+
+markov = lazy_import('volbot.markov')
+
+
+class Entry(object):
+    """A cached model (or a note that there was too little data) for one nick"""
+
+    def __init__(self, model, count):
+        self.model = model  # None if the nick had too few messages
+        self.count = count
+        self.pending = []  # messages logged since the model was built
+        self.lock = threading.Lock()  # held while appending to the model
+
+
+class MimicCache(object):
+    """Keep markov models for recently mimicked nicks.
+
+    loader(nick) must return the nick's most recent messages, oldest first.
+    Messages logged afterwards are passed to note() and are folded into a
+    cached model once at least refresh of them have piled up.  Models are
+    evicted least recently used first to keep the total number of chain
+    states under max_states.  Only one thread builds a given nick's model;
+    others asking for it at the same time wait for that build.
+    """
+
+    def __init__(self, loader, max_states=500000, refresh=50, min_messages=100, window=10000):
+        self.loader = loader
+        self.max_states = max_states
+        self.refresh = refresh
+        self.min_messages = min_messages
+        self.window = window
+
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.evictions = 0
+
+        self._lock = threading.RLock()
+        self._entries = collections.OrderedDict()  # nick -> Entry
+        self._building = {}  # nick -> Event set when its model is built
+
+    def get(self, nick):
+        """Return the model for nick, or None if there is not enough data"""
+        nick = nick.lower()
+        while True:
+            with self._lock:
+                entry = self._entries.get(nick)
+                if entry is not None and entry.model is None and \
+                        entry.count + len(entry.pending) >= self.min_messages:
+                    entry = None  # enough new messages to be worth a real model now
+
+                if entry is not None:
+                    self.hits += 1
+                    pending = None
+                    if entry.model is not None and len(entry.pending) >= self.refresh:
+                        pending, entry.pending = entry.pending, []
+                    self._entries[nick] = self._entries.pop(nick)  # most recently used
+                    break
+
+                # build it ourselves, or wait for whoever already is
+                building = self._building.get(nick)
+                if building is None:
+                    building = self._building[nick] = threading.Event()
+                    self.misses += 1
+                    break
+            building.wait()
+
+        if entry is not None:
+            # fold in new messages outside the lock, so note() isn't held up
+            if pending:
+                self._apply_pending(entry, pending)
+            return entry.model
+
+        # the db query and model build run without the lock, so note() (on
+        # the IRC thread) and other nicks' lookups aren't held up
+        try:
+            entry = self._build(nick)
+            with self._lock:
+                self._entries.pop(nick, None)
+                self._entries[nick] = entry
+                self._evict()
+            return entry.model
+        finally:
+            with self._lock:
+                del self._building[nick]
+            building.set()
+
+    def note(self, nick, msg):
+        """Record a newly logged message for nick.  Once more than window have
+        piled up, the nick's entry is dropped and rebuilt on next use."""
+        nick = nick.lower()
+        with self._lock:
+            entry = self._entries.get(nick)
+            if entry is not None:
+                entry.pending.append(msg)
+                if len(entry.pending) > self.window:
+                    del self._entries[nick]
+                    self.evictions += 1
+
+    def _build(self, nick):
+        messages = self.loader(nick)
+        if len(messages) < self.min_messages:
+            return Entry(None, len(messages))
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            model = markov.WindowText(messages, size=self.window)
+        return Entry(model, len(messages))
+
+    def _apply_pending(self, entry, pending):
+        with entry.lock:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                for msg in pending:
+                    entry.model.append(msg)
+            entry.count += len(pending)
+        with self._lock:
+            self.refreshes += 1
+
+    def states(self):
+        """Return the total number of chain states held in memory"""
+        return sum(len(e.model.chain.model) for e in self._entries.itervalues() if e.model is not None)
+
+    def _evict(self):
+        # never evict the entry that was just used (it is last)
+        total = self.states()
+        while total > self.max_states and len(self._entries) > 1:
+            nick, entry = self._entries.popitem(last=False)
+            if entry.model is not None:
+                total -= len(entry.model.chain.model)
+            self.evictions += 1
+
+    def __str__(self):
+        return "nicks=%d states=%d/%d hits=%d misses=%d refreshes=%d evictions=%d" % (
+            len(self._entries), self.states(), self.max_states, self.hits, self.misses,
+            self.refreshes, self.evictions)
@@ -0,0 +1,143 @@
+"""outbound.py - Flood-controlled outbound message queue and IRC line splitting"""
+
+import collections
+import threading
+import time
+import traceback
+
+
+# an IRC line is at most 512 bytes, including the trailing CRLF
+MAX_LINE = 512
+
+# what we assume about our user@host until the server tells us
+DEFAULT_USER = 'x' * 10
+DEFAULT_HOST = 'x' * 63
+
+
+def privmsg_budget(target, nick, user=DEFAULT_USER, host=DEFAULT_HOST):
+    """Bytes left for the text of a PRIVMSG as the server relays it, i.e.
+    ':nick!user@host PRIVMSG target :text\\r\\n'"""
+    overhead = u':%s!%s@%s PRIVMSG %s :\r\n' % (nick, user, host, target)
+    return MAX_LINE - len(overhead.encode('utf-8'))
+
+
+def split_text(text, limit):
+    """Split unicode text into lines of at most limit UTF-8 bytes.
+
+    Lines are broken at the last space that fits; a word longer than a
+    whole line is broken between characters.
+    """
+    data = text.encode('utf-8')
+    lines = []
+    start = 0
+    while len(data) - start > limit:
+        end = data.rfind(' ', start, start + limit + 1)
+        if end > start:
+            lines.append(data[start:end])
+            start = end + 1
+            continue
+        # no space to break at, so don't cut a multi-byte character
+        end = start + limit
+        while end > start and (ord(data[end]) & 0xC0) == 0x80:
+            end -= 1
+        lines.append(data[start:end])
+        start = end
+    if start < len(data):
+        lines.append(data[start:])
+    return [line.decode('utf-8') for line in lines]
+
+
+class TokenBucket(object):
+    """Allow rate events per second on average, in bursts of up to burst"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last = time.time()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def take(self, now=None):
+        """Use up a token if one is available"""
+        self._refill(now or time.time())
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class Outbound(object):
+    """Queue outgoing lines per target and send them at a flood-safe rate.
+
+    put() may be called from any thread.  drain() sends whatever the token
+    bucket allows, taking one line from each waiting target in turn so one
+    long reply can't hold up the others; it should be run on the reactor
+    (e.g. with execute_every), the only thread that then writes to the
+    connection.  Each target holds at most max_pending lines; more are
+    dropped.  If given, on_sent(seconds) is called with how long each
+    line waited in the queue.
+    """
+
+    def __init__(self, send, rate=0.5, burst=5, max_pending=50, on_sent=None):
+        self.send = send
+        self.bucket = TokenBucket(rate, burst)
+        self.max_pending = max_pending
+        self.on_sent = on_sent
+
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+
+        self._lock = threading.Lock()
+        self._queues = collections.OrderedDict()  # target -> deque of (line, time queued), in turn order
+
+    def put(self, target, line):
+        """Queue a line for target; return False if it was dropped"""
+        with self._lock:
+            queue = self._queues.get(target)
+            if queue is None:
+                queue = self._queues[target] = collections.deque()
+            if len(queue) >= self.max_pending:
+                self.dropped += 1
+                return False
+            queue.append((line, time.time()))
+            return True
+
+    def pending(self):
+        """Return the number of lines waiting to be sent"""
+        with self._lock:
+            return sum(len(queue) for queue in self._queues.itervalues())
+
+    def _next(self):
+        with self._lock:
+            if not self._queues or not self.bucket.take():
+                return None
+            target, queue = self._queues.popitem(last=False)
+            line, queued = queue.popleft()
+            if queue:
+                self._queues[target] = queue  # back of the line
+            return target, line, queued
+
+    def drain(self):
+        """Send as many queued lines as the rate limit allows right now"""
+        while True:
+            item = self._next()
+            if item is None:
+                return
+            target, line, queued = item
+            try:
+                self.send(target, line)
+                self.sent += 1
+            except Exception:
+                self.failed += 1
+                traceback.print_exc()
+                continue
+            if self.on_sent is not None:
+                self.on_sent(time.time() - queued)
+
+    def __str__(self):
+        return "pending=%d sent=%d dropped=%d failed=%d tokens=%.1f/%d" % (
+            self.pending(), self.sent, self.dropped, self.failed, self.bucket.tokens, self.bucket.burst)
@@ -0,0 +1,190 @@
+"""sandbox.py - Evaluate calc expressions in worker processes with time and memory limits"""
+
+import _multiprocessing
+import collections
+import cPickle
+import errno
+import multiprocessing
+import os
+import Queue
+import random
+import signal
+import threading
+
+import calc
+from utils import force
+
+
+def serve(conn, memory, max_result, max_scope):
+    """Worker process main loop: evaluate (expr, scope) requests from conn
+    and send back the result, already formatted, and the new scope if it
+    pickles to at most max_scope bytes"""
+    random.seed()  # don't share rand() state with the other workers
+    if memory:
+        try:
+            import resource
+            resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+        except (ImportError, ValueError):
+            pass
+
+    calculator = calc.Calculator()
+    force(calc.np)
+    while True:
+        try:
+            expr, scope = conn.recv()
+        except EOFError:
+            return
+        try:
+            result = calculator.compile(expr)(scope)
+        except MemoryError:
+            conn.send(('memory', None, None))
+            return  # start over with a fresh process
+        except Exception as e:
+            conn.send(('error', str(e), None))
+            continue
+        # the bot keeps every scope, so don't let one grow it without bound
+        if len(cPickle.dumps(scope, cPickle.HIGHEST_PROTOCOL)) > max_scope:
+            conn.send(('error', "Variables too large to keep.", None))
+            continue
+        # formatting can be as slow as evaluating, so it's done here too
+        try:
+            conn.send(('ok', calc.format_result(result, max_result), scope))
+        except MemoryError:
+            conn.send(('memory', None, None))
+            return
+        except Exception as e:
+            conn.send(('error', str(e), scope))
+
+
+def spawner(control, memory, max_result, max_scope):
+    """Spawner process main loop: fork a worker for each request on control,
+    and send back its pid and our end of its pipe.
+
+    Forking a process with threads can leave the child holding locks no
+    thread will ever release, so once the bot has started its threads,
+    workers are forked from here instead, a process that has none.
+    """
+    while True:
+        try:
+            control.recv()
+        except EOFError:
+            return
+        ours, theirs = multiprocessing.Pipe()
+        pid = os.fork()
+        if pid == 0:
+            control.close()
+            ours.close()
+            try:
+                serve(theirs, memory, max_result, max_scope)
+            finally:
+                os._exit(0)
+        theirs.close()
+        control.send(pid)
+        _multiprocessing.sendfd(control.fileno(), ours.fileno())
+        ours.close()
+
+        # reap workers that have been killed
+        try:
+            while os.waitpid(-1, os.WNOHANG)[0]:
+                pass
+        except OSError as e:
+            if e.errno != errno.ECHILD:
+                raise
+
+
+class Worker(object):
+    """An evaluation process and our end of its pipe"""
+
+    def __init__(self, pid, conn):
+        self.pid = pid
+        self.conn = conn
+
+    def kill(self):
+        self.conn.close()
+        try:
+            os.kill(self.pid, signal.SIGKILL)
+        except OSError:
+            pass  # already gone
+
+
+class CalcSandbox(object):
+    """Run calc evaluations in a pool of worker processes.
+
+    Each evaluation (including formatting its result, capped at
+    max_result characters) gets timeout seconds of wall-clock time, and
+    each worker's address space is capped at memory bytes.  A worker that
+    runs over either limit (or dies) is killed and replaced, the
+    evaluation fails with a CalculationException, and the reason is
+    counted in aborts.  An evaluation that leaves the variables bigger
+    than max_scope bytes (pickled) fails too, and they are left as they
+    were.  Workers are forked by a spawner process started along with
+    the sandbox, which should be before any other threads.
+    """
+
+    def __init__(self, size=2, timeout=2.0, memory=256 * 1024 * 1024, max_result=1000, max_scope=1024 * 1024):
+        self.timeout = timeout
+        self.aborts = collections.Counter()
+        self.idle = Queue.Queue()
+
+        self._spawn_lock = threading.Lock()
+        self._control, child = multiprocessing.Pipe()
+        self._spawner = multiprocessing.Process(target=spawner, args=(child, memory, max_result, max_scope),
+                                                name="volbot-calc-spawner")
+        self._spawner.daemon = True
+        self._spawner.start()
+        child.close()
+
+        for _ in xrange(size):
+            self.idle.put(self._spawn())
+
+    def _spawn(self):
+        with self._spawn_lock:
+            self._control.send('spawn')
+            if not self._control.poll(self.timeout):
+                raise calc.CalculationException("Calculator is unavailable.")
+            pid = self._control.recv()
+            fd = _multiprocessing.recvfd(self._control.fileno())
+            return Worker(pid, _multiprocessing.Connection(fd))
+
+    def evaluate(self, expr, scope):
+        """Evaluate expr with the variables in scope, updating scope in
+        place; return the result formatted as a line of text"""
+        try:
+            worker = self.idle.get(timeout=self.timeout)
+        except Queue.Empty:
+            self.aborts['busy'] += 1
+            raise calc.CalculationException("Calculator is busy.")
+
+        reason = None
+        try:
+            worker.conn.send((expr, scope))
+            if not worker.conn.poll(self.timeout):
+                reason, message = 'timeout', "Calculation took too long."
+            else:
+                status, result, new_scope = worker.conn.recv()
+                if status == 'memory':
+                    reason, message = 'memory', "Calculation used too much memory."
+        except (EOFError, IOError):
+            reason, message = 'crash', "Calculation crashed."
+
+        if reason is None:
+            self.idle.put(worker)
+            if new_scope is not None:
+                scope.clear()
+                scope.update(new_scope)
+            if status == 'error':
+                raise calc.CalculationException(result)
+            return result
+
+        # the worker is stuck or gone, so replace it
+        self.aborts[reason] += 1
+        worker.kill()
+        try:
+            self.idle.put(self._spawn())
+        except (calc.CalculationException, EOFError, IOError):
+            self.aborts['spawn'] += 1
+            # leave the pool a worker short; the next evaluation will say it's busy
+        raise calc.CalculationException(message)
+
+    def __str__(self):
+        return "aborts: %s" % (', '.join("%s=%d" % pair for pair in sorted(self.aborts.items())) or 'none')
@@ -0,0 +1,103 @@
+"""schema.py - Message document schema, indexes and migrations"""
+
+import time
+
+import pymongo
+
+
+VERSION = 2
+
+# compound indexes on the messages collection
+INDEXES = [
+    [('time', pymongo.DESCENDING)],
+    [('nick', pymongo.ASCENDING), ('time', pymongo.DESCENDING)],
+    [('channel', pymongo.ASCENDING), ('time', pymongo.DESCENDING)],
+    [('is_command', pymongo.ASCENDING), ('time', pymongo.DESCENDING)],
+    [('nick', pymongo.ASCENDING), ('is_command', pymongo.ASCENDING), ('time', pymongo.DESCENDING)],
+]
+
+
+def is_command(msg):
+    """Whether a message is a command (or empty), i.e. not chat to learn from"""
+    return not msg or msg.startswith('!')
+
+
+def derived(channel, nick, msg):
+    """Return the fields schema v2 derives from a message"""
+    return {
+        "v": VERSION,
+        "channel": channel,
+        "nick": nick.lower(),
+        "is_command": is_command(msg),
+        "tokens": len(msg.split()),
+    }
+
+
+def chat_filter(current):
+    """Query clause matching chat (not commands).  Until every document has
+    been migrated (current is false), older ones lack is_command, so it
+    falls back to matching on the message itself."""
+    if current:
+        return {"is_command": False}
+    return {"message": {"$regex": "^[^!].*$"}}
+
+
+def make_message(channel, nick, msg, now=None):
+    """Build a message document for insertion"""
+    doc = derived(channel, nick, msg)
+    doc.update({
+        "time": now or time.time(),
+        "display_nick": nick,
+        "message": msg,
+    })
+    return doc
+
+
+def ensure_indexes(db):
+    """Create any missing indexes on the messages collection"""
+    for keys in INDEXES:
+        db.messages.create_index(keys, background=True)
+
+
+def migration_state(db):
+    return db.meta.find_one({"_id": "schema"}) or {"_id": "schema", "version": 1, "last_id": None}
+
+
+def is_current(db):
+    return migration_state(db)["version"] >= VERSION
+
+
+def migrate(db, batch=1000, log=None):
+    """Upgrade every message document to the current schema.
+
+    Documents are visited in _id order and the last _id of each finished
+    batch is checkpointed in the meta collection, so an interrupted run
+    picks up where it left off.  Returns the number of documents upgraded.
+    """
+    state = migration_state(db)
+    upgraded = 0
+    while True:
+        query = {}
+        if state["last_id"] is not None:
+            query["_id"] = {"$gt": state["last_id"]}
+        docs = list(db.messages.find(query, {"channel": 1, "nick": 1, "message": 1, "v": 1},
+                                     sort=[("_id", pymongo.ASCENDING)], limit=batch))
+        if not docs:
+            break
+
+        updates = [
+            pymongo.UpdateOne({"_id": doc["_id"]}, {"$set": derived(doc["channel"], doc["nick"], doc["message"])})
+            for doc in docs if doc.get("v", 1) < VERSION
+        ]
+        if updates:
+            db.messages.bulk_write(updates, ordered=False)
+            upgraded += len(updates)
+
+        state["last_id"] = docs[-1]["_id"]
+        db.meta.replace_one({"_id": "schema"}, state, upsert=True)
+        if log is not None:
+            log("upgraded %d documents (up to %s)" % (upgraded, state["last_id"]))
+
+    state["version"] = VERSION
+    db.meta.replace_one({"_id": "schema"}, state, upsert=True)
+    return upgraded
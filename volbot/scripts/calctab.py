@@ -0,0 +1,18 @@
+#!/usr/bin/env python
+
+
+"""calctab.py - Regenerate the prebuilt PLY tables for calc"""
+
+import sys
+
+from volbot import calc
+
+
+def main():
+    outputdir = sys.argv[1] if len(sys.argv) > 1 else None
+    calc.build_tables(outputdir)
+    print 'wrote calc_lextab.py and calc_parsetab.py'
+
+
+if __name__ == '__main__':
+    main()
@@ -3,15 +3,18 @@
 
 """curses.py - Fetch curses from reddit.com/r/traditionalcurses"""
 
-import cPickle
+import os
+
 import praw
 
+from volbot import corpus
+
 
 def main():
+    path = os.path.join(corpus.EXTRA, 'curses.txt')
     try:
-        with open('curses.txt', 'r') as f:
-            curses = cPickle.load(f)
-    except:
+        curses = set(corpus.read(path))
+    except IOError:
         curses = set()
 
     r = praw.Reddit(
@@ -33,8 +36,7 @@ def main():
                 bads.append(c)
     [curses.remove(b) for b in bads]
 
-    with open('curses.txt', 'w') as f:
-        cPickle.dump(curses, f)
+    corpus.write(path, curses)
 
 
 if __name__ == '__main__':
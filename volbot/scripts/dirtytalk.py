@@ -1,9 +1,11 @@
 #!/usr/bin/env python
 
 
-"""dirtytalk.py - Package dirty talk into pickle objects"""
+"""dirtytalk.py - Package dirty talk into a corpus file"""
 
-import cPickle
+import os
+
+from volbot import corpus
 
 
 def main():
@@ -28,8 +30,7 @@ def main():
                 "I never want you to stop, it feels so good.",
                 "I want you to finish wherever you like."])
 
-    with open('dirtytalk.txt', 'w') as f:
-        cPickle.dump(dirtytalk, f)
+    corpus.write(os.path.join(corpus.EXTRA, 'dirtytalk.txt'), dirtytalk)
 
 if __name__ == '__main__':
     main()
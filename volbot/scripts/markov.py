@@ -0,0 +1,25 @@
+#!/usr/bin/env python
+
+
+"""markov.py - Precompile the markov models shipped in extra/"""
+
+import os
+import sys
+
+from volbot import markov
+
+
+def main():
+    sources = sys.argv[1:]
+    if not sources:
+        extra = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'extra')
+        sources = [os.path.join(extra, 'shake2.txt')]
+
+    for source in sources:
+        dest = markov.compiled_path(source)
+        print 'compiling %s -> %s' % (source, dest)
+        markov.compile_text(source, dest)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,28 @@
+#!/usr/bin/env python
+
+
+"""migrate.py - Upgrade logged messages to the current schema and build indexes"""
+
+import sys
+
+import pymongo
+
+from volbot import schema
+
+
+def main():
+    batch = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+    db = pymongo.MongoClient("localhost", 27017).irc
+
+    print 'ensuring indexes'
+    schema.ensure_indexes(db)
+
+    def log(msg):
+        print msg
+    n = schema.migrate(db, batch, log)
+    print 'done, %d documents upgraded to schema v%d' % (n, schema.VERSION)
+
+
+if __name__ == '__main__':
+    main()
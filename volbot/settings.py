@@ -4,3 +4,18 @@ OWNER = 150
 OP_ONLY = 100
 VOICE_ONLY = 50
 EVERYONE = 0
+
+# directory for on-disk caches; None keeps caches in memory only
+CACHE_DIR = None
+
+# languages auto-translation chooses between; lines detected as anything
+# other than the first are translated to it
+LANGID_LANGUAGES = ['en', 'es']
+
+# outgoing flood control: lines per second on average, and the largest burst
+OUTBOUND_RATE = 0.5
+OUTBOUND_BURST = 5
+
+# port to serve Prometheus metrics on, on localhost only; sharded processes
+# use consecutive ports from here.  None turns the endpoint off
+METRICS_PORT = 9464
@@ -0,0 +1,124 @@
+"""shard.py - Spread channels across bot processes and keep them running"""
+
+import multiprocessing
+import time
+import traceback
+
+
+class Network(object):
+    """An IRC server and the channels to join on it"""
+
+    def __init__(self, server, port, channels):
+        self.server = server
+        self.port = port
+        self.channels = list(channels)
+
+
+class Shard(object):
+    """The channels on one network that one bot process owns"""
+
+    def __init__(self, network, channels):
+        self.network = network
+        self.channels = channels
+        self.process = None
+        self.restarts = 0
+        self.started = 0
+
+    def __str__(self):
+        return "%s:%d %s" % (self.network.server, self.network.port, ','.join(self.channels))
+
+
+def assign(networks, processes):
+    """Split networks' channels into at least one and about processes shards.
+
+    Each network gets a share of the processes in proportion to its
+    channels, and its channels (sorted, so the assignment is stable) are
+    dealt out round-robin.
+    """
+    total = sum(len(n.channels) for n in networks)
+    shards = []
+    for network in networks:
+        count = max(1, min(len(network.channels), int(round(processes * len(network.channels) / float(total)))))
+        dealt = [sorted(network.channels, key=lambda c: c.lower())[i::count] for i in xrange(count)]
+        shards.extend(Shard(network, channels) for channels in dealt if channels)
+    return shards
+
+
+class Coordinator(object):
+    """Run one bot process per shard, restarting any that die.
+
+    target(server, port, channels, index) runs a bot and is called in each
+    child process; index is the shard's position, for anything (like a
+    port) each process needs its own of.  If given, prepare() is called
+    once before any are started, for one-time setup that must not race
+    between processes (like db migrations).  Processes that die are
+    restarted, waiting longer each time one dies again soon after
+    starting.  A process that exits cleanly (status 0, e.g. after !quit)
+    shuts down the whole bot: the coordinator stops the others and
+    returns.
+    """
+
+    def __init__(self, shards, target, prepare=None, log=None, backoff=5.0, max_backoff=300.0):
+        self.shards = shards
+        self.target = target
+        self.prepare = prepare
+        self.log = log or (lambda msg: None)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def _start(self, index, shard):
+        net = shard.network
+        shard.process = multiprocessing.Process(target=self.target,
+                                                args=(net.server, net.port, shard.channels, index),
+                                                name="volbot %s" % shard)
+        shard.process.start()
+        shard.started = time.time()
+        self.log("Started pid %d for %s" % (shard.process.pid, shard))
+
+    def _delay(self, shard):
+        if time.time() - shard.started > self.max_backoff:
+            shard.restarts = 0  # it ran for a good while, so start over
+        delay = min(self.max_backoff, self.backoff * 2 ** shard.restarts)
+        shard.restarts += 1
+        return delay
+
+    def run(self):
+        if self.prepare is not None:
+            self.prepare()
+        for i, shard in enumerate(self.shards):
+            self._start(i, shard)
+
+        restart_at = {}  # shard index -> time
+        try:
+            while True:
+                time.sleep(1.0)
+                now = time.time()
+                for i, shard in enumerate(self.shards):
+                    if shard.process.is_alive():
+                        continue
+                    if shard.process.exitcode == 0:
+                        self.log("pid %d for %s exited cleanly; stopping" % (shard.process.pid, shard))
+                        self.stop()
+                        return
+                    if i not in restart_at:
+                        delay = self._delay(shard)
+                        self.log("pid %d for %s exited with %s; restarting in %.0fs" % (
+                            shard.process.pid, shard, shard.process.exitcode, delay))
+                        restart_at[i] = now + delay
+                    elif now >= restart_at[i]:
+                        del restart_at[i]
+                        try:
+                            self._start(i, shard)
+                        except Exception:
+                            traceback.print_exc()
+        except KeyboardInterrupt:
+            self.stop()
+
+    def stop(self):
+        """Terminate every shard's process"""
+        self.log("Stopping %d processes" % len(self.shards))
+        for shard in self.shards:
+            if shard.process.is_alive():
+                shard.process.terminate()
+        for shard in self.shards:
+            shard.process.join(5)
@@ -0,0 +1,162 @@
+"""stats.py - Pre-aggregated per-nick message statistics"""
+
+import collections
+import heapq
+import re
+import threading
+import traceback
+
+import bson
+import pymongo
+
+
+STOP_WORDS = {
+    'ourselves', 'hers', 'between', 'yourself', 'but', 'again', 'there', 'about', 'once', 'during', 'out',
+    'very', 'having', 'with', 'they', 'own', 'an', 'be', 'some', 'for', 'do', 'its', 'yours', 'such',
+    'into', 'of', 'most', 'itself', 'other', 'off', 'is', 's', 'am', 'or', 'who', 'as', 'from', 'him',
+    'each', 'the', 'themselves', 'until', 'below', 'are', 'we', 'these', 'your', 'his', 'through', 'don',
+    'nor', 'me', 'were', 'her', 'more', 'himself', 'this', 'down', 'should', 'our', 'their', 'while',
+    'above', 'both', 'up', 'to', 'ours', 'had', 'she', 'all', 'no', 'when', 'at', 'any', 'before', 'them',
+    'same', 'and', 'been', 'have', 'in', 'will', 'on', 'does', 'yourselves', 'then', 'that', 'because',
+    'what', 'over', 'why', 'so', 'can', 'did', 'not', 'now', 'under', 'he', 'you', 'herself', 'has', 'just',
+    'where', 'too', 'only', 'myself', 'which', 'those', 'i', 'after', 'few', 'whom', 't', 'being', 'if',
+    'theirs', 'my', 'against', 'a', 'by', 'doing', 'it', 'how', 'further', 'was', 'here', 'than'
+}
+
+# field names can't contain '.' or start with '$', so escape them
+_escapes = {'%': '%25', '.': '%2E', '$': '%24'}
+_unescapes = dict((v, k) for k, v in _escapes.items())
+
+
+def escape(word):
+    return re.sub(r'[%.$]', lambda m: _escapes[m.group(0)], word)
+
+
+def unescape(key):
+    return re.sub(r'%(25|2E|24)', lambda m: _unescapes[m.group(0)], key)
+
+
+def clean(word):
+    return word.strip('.,?!/;:\'"').lower()
+
+
+class Tally(object):
+    """Statistics for one nick, as deltas to add to the stored aggregate"""
+
+    def __init__(self):
+        self.messages = 0
+        self.words = 0
+        self.counter = collections.Counter()
+
+    def add(self, msg):
+        words = [clean(word) for word in msg.split()]
+        self.messages += 1
+        self.words += len(words)
+        self.counter.update(w for w in words if w and w not in STOP_WORDS)
+
+    def update(self, keep=None):
+        """Return the $inc for these deltas, with at most keep words"""
+        inc = {'messages': self.messages, 'words': self.words}
+        for word, count in self.counter.most_common(keep):
+            inc['counts.' + escape(word)] = count
+        return {'$inc': inc}
+
+
+class NickStats(object):
+    """Per-nick message and word counts kept in the nick_stats collection.
+
+    Documents look like {_id: nick, messages: n, words: n, counts: {word: n}}
+    where counts leaves out stop words.  They are updated from each batch
+    the LogWriter inserts, and built once from the whole message log by
+    backfill().  counts only needs to hold the top words, so each nick's is
+    pruned to the keep most frequent every prune_every updates.
+    """
+
+    def __init__(self, db, keep=1000, prune_every=100):
+        self.db = db
+        self.collection = db.nick_stats
+        self.keep = keep
+        self.prune_every = prune_every
+
+        # while a backfill runs, live updates only count messages after this _id
+        self.fence = None
+        self._lock = threading.Lock()
+        self._updates = collections.Counter()  # nick -> updates since last pruned
+
+    def tally(self, docs):
+        """Return a Tally per nick for some message documents"""
+        tallies = collections.defaultdict(Tally)
+        for doc in docs:
+            tallies[doc['nick']].add(doc['message'])
+        return tallies
+
+    def write(self, tallies):
+        """Add tallies to the stored aggregates"""
+        if not tallies:
+            return
+        self.collection.bulk_write([
+            pymongo.UpdateOne({'_id': nick}, tally.update(self.keep), upsert=True)
+            for nick, tally in tallies.iteritems()
+        ], ordered=False)
+
+    def prune(self, nick):
+        """Drop all but nick's keep most frequent words"""
+        doc = self.collection.find_one({'_id': nick}, {'counts': 1})
+        counts = doc.get('counts', {}) if doc else {}
+        if len(counts) > self.keep:
+            top = heapq.nlargest(self.keep, counts.iteritems(), key=lambda pair: pair[1])
+            self.collection.update_one({'_id': nick}, {'$set': {'counts': dict(top)}})
+
+    def apply(self, docs):
+        """Hook for LogWriter: fold newly inserted messages into the aggregates"""
+        try:
+            with self._lock:
+                if self.fence is not None:
+                    docs = [doc for doc in docs if doc['_id'] > self.fence]
+                tallies = self.tally(docs)
+                self.write(tallies)
+                self._updates.update(tallies.iterkeys())
+                for nick, count in self._updates.items():
+                    if count >= self.prune_every:
+                        self.prune(nick)
+                        del self._updates[nick]
+        except Exception:
+            traceback.print_exc()
+
+    def needs_backfill(self):
+        return self.db.meta.find_one({'_id': 'nick_stats'}) is None
+
+    def backfill(self, batch=10000, settle=None):
+        """Build the aggregates from the whole message log; return messages read.
+
+        Live updates may run meanwhile: messages up to a fence _id, taken
+        when the old aggregates are cleared, are counted here and later
+        ones by apply().  settle(), if given, must return once every message
+        with an earlier _id is in the db (e.g. LogWriter.flush).
+        """
+        with self._lock:
+            self.fence = bson.ObjectId()
+            self.collection.delete_many({})
+            self._updates.clear()
+        if settle is not None:
+            settle()
+        try:
+            tallies = self.tally(self.db.messages.find({'_id': {'$lte': self.fence}}, {'nick': 1, 'message': 1},
+                                                       batch_size=batch))
+            with self._lock:
+                self.write(tallies)
+                self.db.meta.replace_one({'_id': 'nick_stats'}, {'_id': 'nick_stats', 'done': True}, upsert=True)
+                self.fence = None
+        except Exception:
+            self.fence = None  # count live messages again; the next start redoes the backfill
+            raise
+        return sum(t.messages for t in tallies.itervalues())
+
+    def lookup(self, nick, top=10):
+        """Return (messages, words, [(word, count), ...]) for nick"""
+        doc = self.collection.find_one({'_id': nick.lower()})
+        if doc is None:
+            return 0, 0, []
+        counts = doc.get('counts', {})
+        favorites = heapq.nlargest(top, counts.iteritems(), key=lambda pair: pair[1])
+        return doc['messages'], doc['words'], [(unescape(w), c) for w, c in favorites]
@@ -0,0 +1,115 @@
+"""translate.py - Caching and batching wrappers around the translation client"""
+
+import collections
+import Queue
+import threading
+import time
+import traceback
+
+from .cache import MISSING
+
+
+class CachedTranslator(object):
+    """Wrap a microsofttranslator.Translator with a (text, language) result cache.
+
+    cache is a TTLCache, so identical requests made while one is still in
+    flight share a single upstream call.
+    """
+
+    def __init__(self, translator, cache):
+        self.translator = translator
+        self.cache = cache
+
+    def translate(self, text, lang):
+        """Translate text to lang"""
+        return self.cache.fetch((lang, text), lambda: self.translator.translate(text, lang))
+
+    def cached(self, text, lang):
+        """Return the cached translation, MISSING, or None if a failure is cached"""
+        try:
+            return self.cache.get((lang, text), MISSING)
+        except Exception:
+            return None
+
+    def translate_many(self, texts, lang):
+        """Translate a list of texts to lang, fetching all misses in one call.
+
+        Texts whose last translation failed (and is still cached as a
+        failure) come back as None rather than failing the whole batch.
+        """
+        results = [self.cached(text, lang) for text in texts]
+        missing = list(collections.OrderedDict.fromkeys(
+            text for text, result in zip(texts, results) if result is MISSING))
+        if missing:
+            fetched = self.translator.translate_array(missing, lang)
+            for text, item in zip(missing, fetched):
+                self.cache.set((lang, text), item['TranslatedText'])
+            translated = dict(zip(missing, (item['TranslatedText'] for item in fetched)))
+            results = [translated[text] if result is MISSING else result
+                       for text, result in zip(texts, results)]
+        return results
+
+
+class TranslationBatcher(object):
+    """Collect automatic translations for a short window and send them together.
+
+    Lines submitted within window seconds of each other (up to max_batch
+    of them) are translated with one translate_array call per target
+    language, and deliver(channel, sender, translation) is then called for
+    each line in the order they were submitted.
+    """
+
+    def __init__(self, translator, deliver, window=0.25, max_batch=25):
+        self.translator = translator
+        self.deliver = deliver
+        self.window = window
+        self.max_batch = max_batch
+        self.queue = Queue.Queue()
+
+        self.batches = 0
+        self.lines = 0
+
+        thread = threading.Thread(target=self._run, name="volbot-translate")
+        thread.daemon = True
+        thread.start()
+
+    def submit(self, channel, sender, text, lang='en'):
+        """Queue a line to be translated and sent back to channel"""
+        self.queue.put((channel, sender, text, lang))
+
+    def _take_batch(self):
+        batch = [self.queue.get()]
+        deadline = time.time() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except Queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            by_lang = collections.defaultdict(list)
+            for i, (channel, sender, text, lang) in enumerate(batch):
+                by_lang[lang].append(i)
+
+            translations = {}
+            for lang, indexes in by_lang.iteritems():
+                try:
+                    results = self.translator.translate_many([batch[i][2] for i in indexes], lang)
+                    translations.update(zip(indexes, results))
+                except Exception:
+                    traceback.print_exc()
+
+            self.batches += 1
+            self.lines += len(batch)
+            for i, (channel, sender, text, lang) in enumerate(batch):
+                if translations.get(i) is not None:
+                    try:
+                        self.deliver(channel, sender, translations[i])
+                    except Exception:
+                        traceback.print_exc()
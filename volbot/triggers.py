@@ -0,0 +1,141 @@
+"""triggers.py - Single-pass dispatcher for channel trigger handlers"""
+
+import random
+import re
+import sre_constants
+import sre_parse
+import time
+
+
+# patterns that match any single line and therefore never need a regex
+CATCH_ALL = {'^.*$', '.*', '^.*', '.*$', '', '^'}
+
+# relative cost of each kind of check, used to order the checks
+COST_DICE = 0
+COST_LITERAL = 1
+COST_REGEX = 10
+
+
+def required_literal(pattern):
+    """Return the longest literal run every match of pattern must contain.
+
+    Only literals at the top level of the pattern are considered, since
+    anything inside a group, branch or repeat may be skipped.  The result
+    is lower-cased so it can be tested against a lower-cased message.
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except sre_constants.error:
+        return None
+
+    best = run = u''
+    for op, arg in parsed:
+        if op == sre_constants.LITERAL:
+            run += unichr(arg)
+            if len(run) > len(best):
+                best = run
+        else:
+            run = u''
+    return best.lower() or None
+
+
+class TriggerStats(object):
+    """Counters kept for a single trigger"""
+
+    __slots__ = ('lines', 'dice', 'prefiltered', 'regex', 'matched', 'seconds')
+
+    def __init__(self):
+        self.lines = 0  # lines offered to the trigger
+        self.dice = 0  # lines skipped by a failed dice roll
+        self.prefiltered = 0  # lines skipped by the literal prefilter
+        self.regex = 0  # regex evaluations
+        self.matched = 0  # handler invocations
+        self.seconds = 0.0  # time spent deciding whether to fire
+
+    def __str__(self):
+        return "lines=%d dice=%d prefiltered=%d regex=%d matched=%d (%.1fus/line)" % (
+            self.lines, self.dice, self.prefiltered, self.regex, self.matched,
+            1e6 * self.seconds / self.lines if self.lines else 0.0)
+
+
+class TriggerCheck(object):
+    """The compiled checks for a single trigger handler"""
+
+    def __init__(self, order, handler):
+        pattern = handler.trigger_pattern
+        self.order = order
+        self.handler = handler
+        self.name = handler.__name__
+        self.chance = getattr(handler, 'trigger_chance', None)
+
+        prefilter = getattr(handler, 'trigger_prefilter', None)
+        if pattern in CATCH_ALL:
+            self.regex = None
+        else:
+            self.regex = re.compile(pattern)
+            if prefilter is None:
+                prefilter = required_literal(pattern)
+        self.prefilter = prefilter.lower() if prefilter else None
+
+        self.cost = COST_DICE if self.chance else 0
+        if self.prefilter:
+            self.cost += COST_LITERAL
+        if self.regex is not None:
+            self.cost += COST_REGEX
+        self.stats = TriggerStats()
+
+    def check(self, msg, lowered):
+        """Return whether the handler should fire for msg"""
+        stats = self.stats
+        stats.lines += 1
+
+        if self.chance and random.randint(1, self.chance) != self.chance:
+            stats.dice += 1
+            return False
+        if self.prefilter and self.prefilter not in lowered:
+            stats.prefiltered += 1
+            return False
+        if self.regex is not None:
+            stats.regex += 1
+            if not self.regex.match(msg):
+                return False
+
+        stats.matched += 1
+        return True
+
+
+class TriggerDispatcher(object):
+    """Decide which trigger handlers fire for a line in a single pass.
+
+    Checks are run cheapest first (dice rolls, then literal substring
+    prefilters, then regexes), but matched handlers are still called in
+    registration order so replies come out the same as before.
+    """
+
+    def __init__(self):
+        self.checks = []
+
+    def add(self, handler):
+        """Register a handler decorated with @Trigger"""
+        self.checks.append(TriggerCheck(len(self.checks), handler))
+        self.checks.sort(key=lambda c: (c.cost, c.order))
+
+    def __len__(self):
+        return len(self.checks)
+
+    def match(self, msg):
+        """Return the handlers that fire for msg, in registration order"""
+        lowered = msg.lower()
+        matched = []
+        for check in self.checks:
+            start = time.time()
+            if check.check(msg, lowered):
+                matched.append(check)
+            check.stats.seconds += time.time() - start
+        matched.sort(key=lambda c: c.order)
+        return [check.handler for check in matched]
+
+    def stats(self):
+        """Return (name, stats) pairs for every trigger, busiest first"""
+        return sorted(((c.name, c.stats) for c in self.checks),
+                      key=lambda pair: -pair[1].matched)
@@ -4,17 +4,21 @@
 #
 # Author: Roman Bogorodskiy <bogorodskiy@gmail.com>
 
+import codecs
 import sys
 
+import requests
+
 if sys.version < '3':
     from urllib import quote as urlquote
-    from urllib2 import urlopen
     from HTMLParser import HTMLParser
 else:
-    from urllib.request import urlopen
     from urllib.parse import quote as urlquote
     from html.parser import HTMLParser
 
+# shared so lookups reuse pooled keep-alive connections
+session = requests.Session()
+
 
 class TermType(object):
     pass
@@ -32,6 +36,7 @@ class UrbanDictParser(HTMLParser):
         HTMLParser.__init__(self, *args, **kwargs)
         self._section = None
         self.translations = []
+        self.complete = 0  # number of translations fully parsed so far
 
     def handle_starttag(self, tag, attrs):
         attrs_dict = dict(attrs)
@@ -43,12 +48,15 @@ class UrbanDictParser(HTMLParser):
         if div_class in ('def-header', 'meaning', 'example'):
             self._section = div_class
             if div_class == 'def-header':  # NOTE: assume 'word' is the first section
+                self.complete = len(self.translations)
                 self.translations.append(
                     {'word': '', 'def': '', 'example': ''})
 
     def handle_endtag(self, tag):
         if tag == 'div':
             # NOTE: assume there is no nested <div> in the known sections
+            if self._section == 'example':  # NOTE: assume 'example' is the last section
+                self.complete = len(self.translations)
             self._section = None
 
     def handle_data(self, data):
@@ -68,17 +76,29 @@ def normalize_newlines(text):
     return text.replace('\r\n', '\n').replace('\r', '\n')
 
 
-def define(term):
+def define(term, limit=None, chunk_size=4096, timeout=10):
+    """Return up to limit definitions of term (all of them if limit is None).
+
+    The page is streamed through the parser and the download stops as soon
+    as limit definitions have been parsed.
+    """
     if isinstance(term, TermTypeRandom):
         url = "http://www.urbandictionary.com/random.php"
     else:
         url = "http://www.urbandictionary.com/define.php?term=%s" % \
-              urlquote(term)
-
-    f = urlopen(url)
-    data = f.read().decode('utf-8')
+              urlquote(term.encode('utf-8') if not isinstance(term, str) else term)
 
     urbanDictParser = UrbanDictParser()
-    urbanDictParser.feed(data)
-
-    return urbanDictParser.translations
+    decoder = codecs.getincrementaldecoder('utf-8')('replace')
+
+    resp = session.get(url, stream=True, timeout=timeout)
+    try:
+        for chunk in resp.iter_content(chunk_size):
+            urbanDictParser.feed(decoder.decode(chunk))
+            if limit is not None and urbanDictParser.complete >= limit:
+                return urbanDictParser.translations[:limit]
+    finally:
+        resp.close()
+
+    urbanDictParser.feed(decoder.decode(b'', True))
+    return urbanDictParser.translations[:limit]
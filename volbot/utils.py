@@ -1 +1,63 @@
 """utils.py - Various helper functions"""
+
+import importlib
+import threading
+import time
+
+
+class LazyObject(object):
+    """Stand-in for an object that is only built, by calling factory(), when
+    one of its attributes is first used"""
+
+    def __init__(self, factory):
+        self.__dict__['_factory'] = factory
+        self.__dict__['_lock'] = threading.Lock()
+
+    def _load(self):
+        value = self.__dict__.get('_value')
+        if value is None:
+            with self._lock:
+                value = self.__dict__.get('_value')
+                if value is None:
+                    value = self.__dict__['_value'] = self._factory()
+        return value
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __len__(self):
+        return len(self._load())
+
+
+def lazy_import(name):
+    """Return a stand-in for module name that imports it on first use"""
+    return LazyObject(lambda: importlib.import_module(name))
+
+
+def force(obj):
+    """Build a LazyObject now (e.g. to warm it up); return the real object"""
+    return obj._load() if isinstance(obj, LazyObject) else obj
+
+
+def is_loaded(obj):
+    """Whether obj is a real object or a LazyObject that has been built"""
+    return not isinstance(obj, LazyObject) or obj.__dict__.get('_value') is not None
+
+
+class PhaseTimer(object):
+    """Time the phases of something (like startup) for a one-line report"""
+
+    def __init__(self, start=None):
+        self.start = start or time.time()
+        self.phases = []
+        self._last = self.start
+
+    def mark(self, name):
+        """End the current phase, calling it name"""
+        now = time.time()
+        self.phases.append((name, now - self._last))
+        self._last = now
+
+    def __str__(self):
+        return "%s (total %.2fs)" % (' '.join("%s=%.2fs" % phase for phase in self.phases),
+                                      self._last - self.start)
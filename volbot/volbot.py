@@ -2,105 +2,356 @@
 
 
 # Python Standard Library
+import time
+STARTED = time.time()
+
+import argparse
 import collections
-import cPickle
+import functools
 import hashlib
 import os
 import random
 import re
-import sys
-import time
+import socket
+import threading
 import traceback
 import warnings
 from string import letters, digits, punctuation
 
-# Third Party Libraries
-import bs4
+# Third Party Libraries (the heavy ones are imported on first use)
 import irc.bot
-import langid
-import markovify
-import microsofttranslator
 import pymongo
-import requests
-import wikipedia
 
 # Project specific imports
 import calc
 from responses import get_resp
-from .urbandict import urbandict
+from .cache import TTLCache
+from .channels import Channels
+from .corpus import Corpora
+from . import dice
+from .langdetect import LanguageDetector
+from .logwriter import LogWriter
+from .translate import CachedTranslator, TranslationBatcher
+from .wiki import Wiki
+from .mimic import MimicCache
+from . import metrics
+from .outbound import Outbound, privmsg_budget, split_text
+from .sandbox import CalcSandbox
+from . import schema
+from .shard import Coordinator, Network, assign
+from .stats import NickStats
+from .triggers import TriggerDispatcher
+from .utils import LazyObject, PhaseTimer, force, is_loaded, lazy_import
+from .workers import WorkerPool
 from .settings import *
 
+bs4 = lazy_import('bs4')
+microsofttranslator = lazy_import('microsofttranslator')
+requests = lazy_import('requests')
+wikipedia = lazy_import('wikipedia')
+markov = lazy_import('volbot.markov')
+urbandict = lazy_import('volbot.urbandict.urbandict')
+
 class Command:
-    """Decorator that automatically registers functions as command handlers"""
+    """Decorator that automatically registers functions as command handlers
 
-    def __init__(self, label, perms=OP_ONLY):
+    Handlers marked offload block on I/O and are run on the worker pool
+    instead of the IRC thread, giving up after timeout seconds.
+    """
+
+    def __init__(self, label, perms=OP_ONLY, offload=False, timeout=None):
         self.label = label
         self.permissions = perms
+        self.offload = offload
+        self.timeout = timeout
 
     def __call__(self, func):
         func.cmd_label = self.label
         func.cmd_perms = self.permissions
+        func.offload = self.offload
+        func.timeout = self.timeout
         return func
 
 
 class Trigger:
-    """Decorator that automatically registers functions as trigger handlers"""
+    """Decorator that automatically registers functions as trigger handlers
+
+    prefilter is a literal that must appear (case-insensitively) in a line for
+    the pattern to be tried; by default it is derived from the pattern.
+    chance makes the trigger fire only one time in that many, rolled before
+    the pattern is tried. offload and timeout work as for Command.
+    """
 
-    def __init__(self, pattern):
+    def __init__(self, pattern, prefilter=None, chance=None, offload=False, timeout=None):
         self.pattern = pattern
+        self.prefilter = prefilter
+        self.chance = chance
+        self.offload = offload
+        self.timeout = timeout
 
     def __call__(self, func):
         func.trigger_pattern = self.pattern
+        func.trigger_prefilter = self.prefilter
+        func.trigger_chance = self.chance
+        func.offload = self.offload
+        func.timeout = self.timeout
         return func
 
 
+def log(msg):
+    timestamp = time.strftime('%m-%d-%y %H:%M:%S')
+    print '[%s] %s' % (timestamp, msg)
+
+
+def prepare_db(db, stats=None, settle=None):
+    """Bring the db up to date: indexes, schema version and per-nick statistics.
+
+    If the bot is already logging, pass its NickStats and a settle function
+    (see NickStats.backfill) so the backfill and live updates don't overlap.
+    """
+    schema.ensure_indexes(db)
+    if not schema.is_current(db):
+        # resumable, and quick when only a few (or no) messages need it
+        log("Upgrading message log to schema v%d" % schema.VERSION)
+        log("Upgraded %d messages" % schema.migrate(db))
+    stats = stats or NickStats(db)
+    if stats.needs_backfill():
+        log("Building per-nick statistics (one time)")
+        log("Counted %d messages" % stats.backfill(settle=settle))
+
+
 class VolBot(irc.bot.SingleServerIRCBot):
-    def __init__(self, channel, nickname, server, port=6667):
-        self.log("Connecting to %s:%s as %s" % (server, port, nickname))
+    """The bot, in one or more channels on one server.
+
+    When several processes share the db, only one of them (or whoever
+    starts them) should prepare it; the rest pass prepare_db=False.
+    """
+
+    def __init__(self, channels, nickname, server, port=6667, owner=None, prepare_db=True, metrics_port=None,
+                 shard=None):
+        self.startup = PhaseTimer(STARTED)
+        self.startup.mark('imports')
+        if isinstance(channels, basestring):
+            channels = [channels]
+        self.log("Connecting to %s:%s as %s, for %s" % (server, port, nickname, ', '.join(channels)))
         irc.bot.SingleServerIRCBot.__init__(self, [(server, port)], nickname, nickname)
 
-        self.channel = channel
+        self.owner = owner
+        self.prepare_db = prepare_db
+        self.shard = shard  # our index when one of several processes
 
-        # initialize shakespearean generator
-        self.log("Loading shakespearean texts")
+        # fork the calculator processes before any other threads start
+        self.calc_sandbox = CalcSandbox()
+        # calculator variables, separate for each of our channels (private
+        # chats get theirs from the 'calculators' cache, which is bounded)
+        self.calculators = collections.defaultdict(calc.Calculator)
+
+        # the markov models are built on first use, or by warm_up() once
+        # we're connected (shakespeare is precompiled by volbot-markov)
         shake_path = os.path.join(os.path.dirname(__file__), 'extra/shake2.txt')
-        with open(shake_path) as f:
-            self.shakespeare = markovify.Text(f.read())
+        self.shakespeare = LazyObject(lambda: markov.load_text(shake_path))
+
+        # settings and volify models, separate for each channel
+        self.channel_states = Channels(channels, lambda name: LazyObject(lambda: self.read_volify(name)))
 
-        # set up db
-        self.log("Connecting to MongoDB")
+        # set up db (the client connects in the background; the schema and
+        # statistics checks wait for warm_up())
         client = pymongo.MongoClient("localhost", 27017)
         self.db = client.irc
-
-        # initialize volify markov thing
-        self.log("Loading chat history for volify")
-        self.load_volify()
+        self.schema_current = False  # until we've seen the migration finish
+
+        # per-nick statistics, kept up to date by the log writer
+        self.stats = NickStats(self.db)
+        self.log_writer = LogWriter(self.db.messages, on_write=self.stats.apply)
+
+        # caches, by name
+        self.caches = {
+            'links': TTLCache(maxsize=2048, ttl=6 * 3600, negative_ttl=300, path=self.cache_path('links')),
+            'translations': TTLCache(maxsize=4096, ttl=7 * 24 * 3600, negative_ttl=30,
+                                     path=self.cache_path('translations')),
+            'urbandict': TTLCache(maxsize=1024, ttl=24 * 3600, negative_ttl=300),
+            'wikipedia': TTLCache(maxsize=2048, ttl=24 * 3600, negative_ttl=600, path=self.cache_path('wikipedia')),
+            'calculators': TTLCache(maxsize=256, ttl=24 * 3600),
+        }
+        self.wiki = Wiki(self.caches['wikipedia'])
 
         # initialize translator
         # pls do not abuse API key
-        self.translator = microsofttranslator.Translator('volbot', '5n6uDST15barp2ScGZe/ylNW4j388lZeooy+tbAfqo4=')
-
-        self.ignored = {'volbot', 'stuessbot'}
-        self.translate_settings = collections.defaultdict(lambda : "off")
+        self.translator = CachedTranslator(
+            LazyObject(lambda: microsofttranslator.Translator('volbot', '5n6uDST15barp2ScGZe/ylNW4j388lZeooy+tbAfqo4=')),
+            self.caches['translations'])
+        self.auto_translations = TranslationBatcher(self.translator, self.send_translation)
+
+        # counters and latency histograms, for !perf and the metrics endpoint
+        self.metrics = metrics.Registry()
+        self.handler_seconds = self.metrics.histogram(
+            'volbot_handler_seconds', 'Time spent in command and trigger handlers.', ('kind', 'handler'))
+        self.handler_errors = self.metrics.counter(
+            'volbot_handler_errors_total', 'Handler calls that raised an exception.', ('kind', 'handler'))
+        self.handler_timeouts = self.metrics.counter(
+            'volbot_handler_timeouts_total', 'Offloaded handler calls abandoned after their timeout.',
+            ('kind', 'handler'))
+        self.match_seconds = self.metrics.histogram(
+            'volbot_trigger_match_seconds', 'Time spent finding the triggers a line fires.')
+        self.log_seconds = self.metrics.histogram(
+            'volbot_log_msg_seconds', 'Time spent logging a message.')
+        self.send_seconds = self.metrics.histogram(
+            'volbot_outbound_send_seconds', 'Time spent sending a line to the server.')
+        self.send_wait = self.metrics.histogram(
+            'volbot_outbound_wait_seconds', 'Time lines waited in the outbound queue.')
+
+        # pool for handlers that block on network or db I/O
+        self.workers = WorkerPool()
+
+        # replies are queued and sent from the reactor at a flood-safe rate
+        self.outbound = Outbound(self.deliver, OUTBOUND_RATE, OUTBOUND_BURST, on_sent=self.send_wait.observe)
+        self.reactor.execute_every(0.1, self.outbound.drain)
+        self.reactor_thread = None
+        self.userhost = ()  # our user and host, once we've seen them
+
+        self.mimics = MimicCache(self.nick_history)
+        self.corpora = Corpora()
+
+        self.langid = LanguageDetector(LANGID_LANGUAGES)
+
+        # queue depths and the totals other parts already keep, read when scraped
+        queues = self.metrics.gauge('volbot_queue_depth', 'Items waiting in each queue.', ('queue',))
+        queues.track(self.outbound.pending, 'outbound')
+        queues.track(self.workers.pending, 'workers')
+        queues.track(self.log_writer.pending, 'log_writer')
+        queues.track(self.auto_translations.queue.qsize, 'translations')
+        outbound = self.metrics.gauge('volbot_outbound_lines_total', 'Outbound lines, by what became of them.',
+                                      ('result',), kind='counter')
+        for result in ('sent', 'dropped', 'failed'):
+            outbound.track(functools.partial(getattr, self.outbound, result), result)
+        jobs = self.metrics.gauge('volbot_worker_jobs_total', 'Worker pool jobs, by how they ended.',
+                                  ('result',), kind='counter')
+        for result in ('completed', 'failed', 'timed_out', 'rejected'):
+            jobs.track(functools.partial(getattr, self.workers, result), result)
+        aborts = self.metrics.gauge('volbot_calc_aborts_total', 'Calculations aborted, by reason.',
+                                    ('reason',), kind='counter')
+        for reason in ('busy', 'timeout', 'memory', 'crash', 'spawn'):
+            aborts.track(functools.partial(self.calc_sandbox.aborts.__getitem__, reason), reason)
+        if metrics_port is not None:
+            try:
+                metrics.serve(self.metrics, metrics_port)
+                self.log("Serving metrics on http://127.0.0.1:%d/metrics" % metrics_port)
+            except socket.error as e:
+                self.log("Not serving metrics on port %d: %s" % (metrics_port, e))
 
         # setup commands and triggers
         self.commands = {}
-        self.triggers = []
+        self.triggers = TriggerDispatcher()
         self.register_stuff()
+        self.startup.mark('init')
 
-    def load_volify(self):
+    def run_warm_up(self):
+        try:
+            self.warm_up()
+        except Exception:
+            traceback.print_exc()
+
+    def warm_up(self):
+        """Check the db and build everything that was put off at startup"""
+        timer = PhaseTimer()
+
+        phases = []
+        if self.prepare_db:
+            phases.append(('db', lambda: prepare_db(self.db, self.stats, self.log_writer.flush)))
+        phases.extend([
+            ('volify', lambda: [force(state.volify) for state in self.channel_states]),
+            ('shakespeare', lambda: force(self.shakespeare)),
+            ('imports', lambda: [force(module) for module in (requests, bs4, wikipedia, microsofttranslator,
+                                                               urbandict)]),
+            ('wiki', self.wiki.prefetch),
+        ])
+
+        # one phase failing (say, a missing model) shouldn't hold up the rest;
+        # models and modules that failed are loaded again when first used
+        for name, phase in phases:
+            try:
+                phase()
+            except Exception:
+                self.log("Warm-up phase '%s' failed:" % name)
+                traceback.print_exc()
+                name += '(failed)'
+            timer.mark(name)
+
+        self.log("Warmed up: %s" % timer)
+
+    def read_volify(self, channel):
+        """Build a volify model for a channel from the db"""
+        query = {
+            "channel": channel,
+            "nick": {"$ne": self._nickname.lower()},
+        }
+        query.update(self.chat_filter())
         messages = self.db.messages.find(
-            {
-                "nick": {"$ne": self._nickname.lower()},
-                "message": {"$regex": "^[^!].*$"},
-            },
+            query,
             limit=10000,
             sort=[("time", pymongo.DESCENDING)]
         )  # the idea is that it grabs the most recent 10,000 messages
+        history = [doc['message'] for doc in messages]
+        history.reverse()
         with warnings.catch_warnings():
             warnings.simplefilter("ignore")
-            self.volify = markovify.Text('. '.join(doc['message'] for doc in messages))
-        return messages.count()
+            return markov.WindowText(history, size=10000)
+
+    def load_volify(self, state):
+        """(Re)build a channel's volify model from the db; return the message count"""
+        state.volify = self.read_volify(state.name)
+        return len(state.volify)
+
+    def update_volify(self, chan, nick, msg):
+        """Feed a newly logged message into the volify and mimic models"""
+        if schema.is_command(msg):
+            return
+        self.mimics.note(nick, msg)
+        state = self.channel_states.get(chan)
+        if state is None or nick.lower() == self._nickname.lower() or not is_loaded(state.volify):
+            return  # an unbuilt model will read the message from the db
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            state.volify.append(msg)
+
+    def nick_history(self, nick):
+        """Return a nick's most recent 10,000 non-command messages, oldest first"""
+        query = {"nick": nick.lower()}
+        query.update(self.chat_filter())
+        messages = self.db.messages.find(
+            query,
+            limit=10000,
+            sort=[("time", pymongo.DESCENDING)]
+        )
+        history = [doc['message'] for doc in messages]
+        history.reverse()
+        return history
+
+    def chat_filter(self):
+        """Query clause matching chat, using is_command once the db is migrated"""
+        if not self.schema_current:
+            self.schema_current = schema.is_current(self.db)
+        return schema.chat_filter(self.schema_current)
+
+    def calculator(self, target):
+        """Return the calculator for a channel or private chat"""
+        if self.channel_states.get(target) is not None:
+            return self.calculators[target.lower()]
+        return self.caches['calculators'].fetch(target.lower(), calc.Calculator)
+
+    def cache_path(self, name):
+        """Return the path of the on-disk tier for a cache, if enabled.  Each
+        process gets its own files, since shelves can't be shared."""
+        if CACHE_DIR is None:
+            return None
+        try:
+            os.makedirs(CACHE_DIR)
+        except OSError:
+            if not os.path.isdir(CACHE_DIR):
+                raise
+        if self.shard is not None:
+            name = '%s-%d' % (name, self.shard)
+        return os.path.join(CACHE_DIR, '%s.db' % name)
 
     def on_nicknameinuse(self, conn, e):
         """Handle when our nickname is already taken"""
@@ -109,7 +360,25 @@ class VolBot(irc.bot.SingleServerIRCBot):
     def on_welcome(self, conn, e):
         """Handle successful connection to IRC server"""
         self.log("Connected to IRC server.")
-        conn.join(self.channel)
+        self.startup.mark('connect')
+        self.reactor_thread = threading.current_thread()
+        for name in self.channel_states.names:
+            conn.join(name)
+
+    def on_join(self, conn, e):
+        """Handle a join; note our user@host, and the first time report startup times and warm up"""
+        if e.source.nick != conn.get_nickname():
+            return
+        self.userhost = (e.source.user, e.source.host)
+        if self.startup is None:
+            return
+        self.startup.mark('join')
+        self.log("Started: %s" % self.startup)
+        self.startup = None
+
+        thread = threading.Thread(target=self.run_warm_up, name="volbot-warmup")
+        thread.daemon = True
+        thread.start()
 
     def on_privmsg(self, conn, e):
         """Handle a private message"""
@@ -129,7 +398,7 @@ class VolBot(irc.bot.SingleServerIRCBot):
 
         self.log_msg(channel, nick, msg)
 
-        if nick in self.ignored:
+        if nick in self.channel_states.default(channel).ignored:
             return
 
         try:
@@ -139,75 +408,80 @@ class VolBot(irc.bot.SingleServerIRCBot):
                 if len(parts) > 1:
                     self.do_command(e, channel, parts[1], parts[2:])
             else:
-                for pattern, handler in self.triggers:
-                    if pattern.match(msg):
-                        handler(nick, channel, msg)
+                with self.match_seconds.time():
+                    handlers = self.triggers.match(msg)
+                for handler in handlers:
+                    self.dispatch(channel, handler.offload, self.run_trigger, (handler, nick, channel, msg),
+                                  handler.timeout,
+                                  functools.partial(self.handler_timeouts.inc, 'trigger', handler.__name__))
         except UnicodeEncodeError:
             traceback.print_exc()
         except:
             traceback.print_exc()
 
     def log(self, msg):
-        timestamp = time.strftime('%m-%d-%y %H:%M:%S')
-        print '[%s] %s' % (timestamp, msg)
+        log(msg)
 
     def log_msg(self, chan, nick, msg):
+        with self.log_seconds.time():
+            self.log('<%s> %s: %s' % (chan, nick, msg))
 
-        self.log('<%s> %s: %s' % (chan, nick, msg))
+            self.log_writer.write(schema.make_message(chan, nick, msg))
+            self.update_volify(chan, nick, msg)
 
-        self.db.messages.insert_one({
-            "time": time.time(),
-            "channel": chan,
-            "nick": nick.lower(),
-            "message": msg,
-        })
+    def die(self, msg="Bye, cruel world!"):
+        """Flush pending message logs before disconnecting"""
+        self.log("Flushing message log (%s)" % self.log_writer)
+        self.log_writer.close()
+        for cache in self.caches.values():
+            cache.close()
+        irc.bot.SingleServerIRCBot.die(self, msg)
 
-    @Trigger(r"^.*;\s*$")
+    @Trigger(r"^.*;\s*$", offload=True)
     def on_calc(self, sender, channel, msg):
         """Trigger handler for calculations"""
         try:
-            self.privmsg(channel, str(calc.eval(msg)))
+            self.privmsg(channel, self.calc_sandbox.evaluate(msg, self.calculator(channel).variables))
         except calc.CalculationException:
             pass
 
-    @Trigger(r"^.*\b[iI][rR][cC]\b.*$")
+    @Trigger(r"^.*\b[iI][rR][cC]\b.*$", prefilter="irc", chance=100)
     def on_talks_about_irc(self, sender, channel, msg):
         """Trigger handler for when someone says IRC (based on inside joke)"""
-        if random.randint(1, 100) == 100:
-            message = "\"" + msg + "\" -- " + sender
-            self.privmsg(channel, message)
+        message = "\"" + msg + "\" -- " + sender
+        self.privmsg(channel, message)
 
-    @Trigger(r"^.*\b[a-zA-Z]{2}[a-zA-Z]+[bcdfgklmnprstvwxz]er\b.*$")
+    @Trigger(r"^.*\b[a-zA-Z]{2}[a-zA-Z]+[bcdfgklmnprstvwxz]er\b.*$", prefilter="er", chance=100)
     def on_er(self, sender, channel, msg):
-        if random.randint(1, 100) == 100:
-            er_words = re.findall(r"\b[a-zA-Z]{2}[a-zA-Z]+[bcdfgklmnprstvwxz]er\b", msg)
-            word = random.choice(er_words)
-            self.privmsg(channel, "%s? I hardly know 'er!" % word)
+        er_words = re.findall(r"\b[a-zA-Z]{2}[a-zA-Z]+[bcdfgklmnprstvwxz]er\b", msg)
+        word = random.choice(er_words)
+        self.privmsg(channel, "%s? I hardly know 'er!" % word)
 
-    @Trigger(r".*\b[aA]y+\b")
+    @Trigger(r".*\b[aA]y+\b", prefilter="ay")
     def on_ayy(self, sender, channel, msg):
         """Trigger handler for ayy, lmao"""
         ayy = re.findall(r".*\b[Aa]y+\b", msg)
         message = 'lma' + (ayy[0].count('y') - 1) * 'o'
         self.privmsg(channel, message)
 
-    @Trigger("^.*$")
+    @Trigger("^.*$", prefilter=u'\u253B')
     def on_table_flip(self, sender, channel, msg):
         """Trigger handler for table flipping"""
-        if u'\u253B' in msg:
-            self.privmsg(channel, u"\u252C\u2500\u252C\u30CE(\xBA_\xBA\u30CE)")
+        self.privmsg(channel, u"\u252C\u2500\u252C\u30CE(\xBA_\xBA\u30CE)")
 
     @Trigger("^.*$")
     def on_lang(self, sender, channel, msg):
-        """Trigger handler for table flipping"""
-        lang, prob = langid.classify(msg)
-        needs_translate = lang == 'es'
-        setting = self.translate_settings[sender]
-        if setting  == 'on'  or (setting == 'auto' and needs_translate):
-            try:
-                self.privmsg(channel, "%s: %s" % (sender, self.translator.translate(msg, 'en')))
-            except:
-                pass
+        """Trigger handler for automatic translation"""
+        # only classify lines from people who asked for translation
+        setting = self.channel_states.default(channel).translate_settings[sender]
+        if setting == 'off':
+            return
+        if setting == 'on' or self.langid.classify(msg) != LANGID_LANGUAGES[0]:
+            self.auto_translations.submit(channel, sender, msg, 'en')
+
+    def send_translation(self, channel, sender, translation):
+        """Send an automatic translation back to the channel"""
+        self.privmsg(channel, "%s: %s" % (sender, translation))
 
     @Trigger("^\s*ls\s*$")
     def on_ls(self, sender, channel, msg):
@@ -230,34 +504,38 @@ class VolBot(irc.bot.SingleServerIRCBot):
         """How I met your mother reference"""
         self.privmsg(channel, "I said a-bang. bang. bangity bang. I said a-bang bang bangity bang.")
 
-    @Trigger(r"^.*https?://[^\s]+.*$")
+    @Trigger(r"^.*https?://[^\s]+.*$", offload=True)
     def on_link(self, sender, channel, msg):
         """Trigger handler for website links"""
 
-        headers = {
-            'User-Agent': 'python:volbot:1.0',
-        }
-
         # find all links in the message
         links = re.findall(r"https?://[^\s]+", msg)
         for link in links:
             # scrape the title of the webpage and send it to the channel
             try:
-                resp = requests.get(link, headers=headers).text
-                soup = bs4.BeautifulSoup(resp, 'html.parser')
-                title = soup.find('title').get_text().strip()
-                okchars = letters + digits + punctuation + ' '
-                title = ''.join(c for c in title if c in okchars).strip()
+                title = self.caches['links'].fetch(link, lambda: self.fetch_title(link))
                 self.privmsg(channel, '%s' % (title))
             except:
                 pass
 
-    @Command("calc", EVERYONE)
+    def fetch_title(self, link):
+        """Download a web page and return its cleaned-up title"""
+        headers = {
+            'User-Agent': 'python:volbot:1.0',
+        }
+
+        resp = requests.get(link, headers=headers, timeout=10).text
+        soup = bs4.BeautifulSoup(resp, 'html.parser')
+        title = soup.find('title').get_text().strip()
+        okchars = letters + digits + punctuation + ' '
+        return ''.join(c for c in title if c in okchars).strip()
+
+    @Command("calc", EVERYONE, offload=True)
     def cmd_calc(self, sender, channel, cmd, args):
         """calc <expression>\nEvaluate an expression."""
         msg = ' '.join(args)
         try:
-            self.privmsg(channel, str(calc.eval(msg)))
+            self.privmsg(channel, self.calc_sandbox.evaluate(msg, self.calculator(channel).variables))
         except calc.CalculationException as e:
             self.privmsg(channel, str(e))
 
@@ -268,7 +546,8 @@ class VolBot(irc.bot.SingleServerIRCBot):
             self.send_usage(self.cmd_at)
             return
         setting = args[0].lower()
-        self.translate_settings[sender] = setting
+        for state in self.channel_states.for_target(channel):
+            state.translate_settings[sender] = setting
         self.privmsg(channel, "Translation for user %s is now: %s" % (sender,setting))
 
     @Command("md5", EVERYONE)
@@ -292,13 +571,8 @@ class VolBot(irc.bot.SingleServerIRCBot):
         else:
             victim = sender
 
-        # load curses
-        curses_path = os.path.join(os.path.dirname(__file__), 'extra/curses.txt')
-        with open(curses_path, 'r') as f:
-            curses = list(cPickle.load(f))
-
         # send a random curse
-        self.privmsg(channel, "%s: %s" % (victim, random.choice(curses)))
+        self.privmsg(channel, "%s: %s" % (victim, self.corpora['curses.txt'].choice()))
 
     @Command("dirtytalk", EVERYONE)
     def cmd_dirtytalk(self, sender, channel, cmd, args):
@@ -309,24 +583,24 @@ class VolBot(irc.bot.SingleServerIRCBot):
         else:
             victim = None
 
-        # load dirty talk
-        dirtytalk_path = os.path.join(os.path.dirname(__file__), 'extra/dirtytalk.txt')
-        with open(dirtytalk_path, 'r') as f:
-            dirtytalk_phrases = list(cPickle.load(f))
-
         # send a random dirty message
+        phrase = self.corpora['dirtytalk.txt'].choice()
         if victim is not None:
-            self.privmsg(channel, "%s: %s" % (victim, random.choice(dirtytalk_phrases)))
+            self.privmsg(channel, "%s: %s" % (victim, phrase))
         else:
-            self.privmsg(channel, "%s" % (random.choice(dirtytalk_phrases)))
+            self.privmsg(channel, "%s" % phrase)
 
     @Command("quit", OP_ONLY)
     def cmd_quit(self, sender, channel, cmd, args):
         """quit\nQuit."""
+        if threading.current_thread() is not self.reactor_thread:
+            # queued behind other jobs for the channel; quit from the IRC thread
+            self.reactor.execute_delayed(0, self.cmd_quit, (sender, channel, cmd, args))
+            return
         self.privmsg(channel, get_resp("quit"))
         self.die()
 
-    @Command("mimic", EVERYONE)
+    @Command("mimic", EVERYONE, offload=True)
     def cmd_mimic(self, sender, channel, cmd, args):
         """mimic [user]\nMimic a user."""
         if len(args) > 0:
@@ -334,32 +608,25 @@ class VolBot(irc.bot.SingleServerIRCBot):
         else:
             nick = sender
 
-        messages = self.db.messages.find(
-            {
-                "nick": nick.lower(),
-                "message": {"$regex": "^[^!].*$"},
-            },
-            limit=10000,
-            sort=[("time", pymongo.DESCENDING)]
-        )  # the idea is that it grabs the most recent 10,000 messages
-
-        if messages.count() < 100:
+        user_simulator = self.mimics.get(nick)
+        if user_simulator is None:
             self.privmsg(channel, "Sorry, not enough data for that user :(")
             return
-        user_simulator = markovify.Text('. '.join(doc['message'] for doc in messages))
         self.privmsg(channel, user_simulator.make_short_sentence(500))
 
     @Command("ignore", OP_ONLY)
     def cmd_ignore(self, sender, channel, cmd, args):
-        """ignore <nick>\nIgnore <nick>."""
+        """ignore <nick>\nIgnore <nick> (in every channel, if sent privately)."""
         if len(args) > 0:
-            self.ignored.add(args[0])
+            for state in self.channel_states.for_target(channel):
+                state.ignored.add(args[0])
 
     @Command("unignore", OP_ONLY)
     def cmd_unignore(self, sender, channel, cmd, args):
         """unignore <nick>\nStop ignoring <nick>."""
         if len(args) > 0:
-            self.ignored.remove(args[0])
+            for state in self.channel_states.for_target(channel):
+                state.ignored.discard(args[0])
 
     @Command("help", EVERYONE)
     def cmd_help(self, sender, channel, cmd, args):
@@ -379,37 +646,17 @@ class VolBot(irc.bot.SingleServerIRCBot):
             cmd = self.commands[helpcmd.lower()]
             self.send_usage(channel, cmd)
 
-    @Command("roll", EVERYONE)
+    @Command("roll", EVERYONE, offload=True)
     def cmd_roll(self, sender, channel, cmd, args):
-        """roll [x]d<y>\nRoll a y sided die x times."""
+        """roll [x]d<y>[kh<n>|kl<n>][+...]\nRoll dice, e.g. 3d6, d20+5, 4d6kh3 (keep the 3 highest) or 2d8+1d4-1."""
         if len(args) == 0:
             self.send_usage(channel, self.cmd_roll)
             return
-        parts = args[0].split('d')
-        if len(parts) != 2:
-            self.send_usage(channel, self.cmd_roll)
-            return
 
         try:
-            if parts[0] == '':
-                rolls = 1
-                sides = int(parts[1])
-            else:
-                rolls, sides = [int(x) for x in parts]
-        except ValueError:
-            self.send_usage(channel, self.cmd_roll)
-            return
-
-        if rolls < 0 or sides < 1:
-            self.send_usage(channel, self.cmd_roll)
-            return
-
-        if rolls > 100000:
-            self.privmsg(channel, "too many rolls!")
-            return
-            
-        n = sum(random.randint(1, sides) for _ in range(rolls))
-        self.privmsg(channel, str(n))
+            self.privmsg(channel, str(dice.roll(' '.join(args))))
+        except dice.DiceError as e:
+            self.privmsg(channel, str(e))
 
     @Command("banana", EVERYONE)
     def cmd_banana(self, sender, channel, cmd, args):
@@ -427,12 +674,12 @@ class VolBot(irc.bot.SingleServerIRCBot):
 
         self.privmsg(channel, banana)
 
-    @Command("shakespeare", EVERYONE)
+    @Command("shakespeare", EVERYONE, offload=True)
     def cmd_shakespeare(self, sender, channel, cmd, args):
         """shakespeare\nGenerate some classic literature.."""
         self.privmsg(channel, self.shakespeare.make_short_sentence(500))
 
-    @Command("stats", EVERYONE)
+    @Command("stats", EVERYONE, offload=True)
     def cmd_stats(self, sender, channel, cmd, args):
         """stats [nick]\nPrint statistics for a nickname"""
         if len(args) > 0:
@@ -440,40 +687,19 @@ class VolBot(irc.bot.SingleServerIRCBot):
         else:
             nick = sender
 
-        nick_messages = self.db.messages.find({"nick": nick.lower()})
-        all_messages = self.db.messages.find()
-        nick_count = nick_messages.count()
-        all_count = all_messages.count()
+        # make sure the aggregates include everything logged so far
+        self.log_writer.flush()
+        nick_count, wc, favorites = self.stats.lookup(nick)
+        all_count = self.db.messages.count()
         percent = 100.0 * float(nick_count) / all_count
 
-        def clean(word):
-            return word.strip('.,?!/;:\'"').lower()
-
-        counter = collections.Counter()
-        for doc in nick_messages:
-            counter.update([clean(word) for word in doc['message'].split()])
-        # total number of words from user.
-        wc = sum(counter.itervalues())
-        stop = {'ourselves', 'hers', 'between', 'yourself', 'but', 'again', 'there', 'about', 'once', 'during', 'out',
-                'very', 'having', 'with', 'they', 'own', 'an', 'be', 'some', 'for', 'do', 'its', 'yours', 'such',
-                'into', 'of', 'most', 'itself', 'other', 'off', 'is', 's', 'am', 'or', 'who', 'as', 'from', 'him',
-                'each', 'the', 'themselves', 'until', 'below', 'are', 'we', 'these', 'your', 'his', 'through', 'don',
-                'nor', 'me', 'were', 'her', 'more', 'himself', 'this', 'down', 'should', 'our', 'their', 'while',
-                'above', 'both', 'up', 'to', 'ours', 'had', 'she', 'all', 'no', 'when', 'at', 'any', 'before', 'them',
-                'same', 'and', 'been', 'have', 'in', 'will', 'on', 'does', 'yourselves', 'then', 'that', 'because',
-                'what', 'over', 'why', 'so', 'can', 'did', 'not', 'now', 'under', 'he', 'you', 'herself', 'has', 'just',
-                'where', 'too', 'only', 'myself', 'which', 'those', 'i', 'after', 'few', 'whom', 't', 'being', 'if',
-                'theirs', 'my', 'against', 'a', 'by', 'doing', 'it', 'how', 'further', 'was', 'here', 'than'}
-
-        favorites = [(w, c) for w, c in counter.most_common() if w not in stop][:10]
-
         self.privmsg(channel, "%s sent %d messages of %d logged messages (%.2f%%)" %
                      (nick, nick_count, all_count, percent))
         self.privmsg(channel, "Used %d unique words. Favorites: %s" % (wc, ', '.join(
             "%s (%.2f%%)" % (w, (float(c) / wc)) for w, c in favorites
         )))
 
-    @Command("translate", EVERYONE)
+    @Command("translate", EVERYONE, offload=True)
     def cmd_translate(self, sender, channel, cmd, args):
         """translate [-<language>] [@person] [text]\nTranslate text to given language code (default en). Adding @person gets the last message from that person and translates it"""
         # arguments are a language code and a "person to translate" argument
@@ -491,12 +717,12 @@ class VolBot(irc.bot.SingleServerIRCBot):
         if args[i].startswith('@'):
             target = args[i][1:]
             # get last message by user that wasn't a command
+            self.log_writer.flush()
+            query = {"nick": target.lower()}
+            query.update(self.chat_filter())
             try:
                 messages = self.db.messages.find(
-                    {
-                        "nick": target.lower(),
-                        "message": {"$regex": "^[^!].*$"}
-                    },
+                    query,
                     limit=1, 
                     sort=[("time", pymongo.DESCENDING)]
                 )
@@ -509,16 +735,24 @@ class VolBot(irc.bot.SingleServerIRCBot):
 
         self.privmsg(channel, self.translator.translate(text, lang))
 
-    @Command("volify", EVERYONE)
+    @Command("volify", EVERYONE, offload=True)
     def cmd_volify(self, sender, channel, cmd, args):
         """volify\nSee what we really sound like."""
-        self.privmsg(channel, self.volify.make_short_sentence(500))
+        self.privmsg(channel, self.channel_states.default(channel).volify.make_short_sentence(500))
 
-    @Command("rlvolify", OP_ONLY)
+    @Command("rlvolify", OP_ONLY, offload=True)
     def cmd_rlvolify(self, sender, channel, cmd, args):
         """rlvolify\nReload the chat logs for the volify command"""
-        n = self.load_volify()
-        self.privmsg(channel, "Reloaded corpus of %d messages." % n)
+        # the model is kept up to date as messages arrive, so this is only a
+        # consistency check against the db
+        self.log_writer.flush()
+        state = self.channel_states.default(channel)
+        live = state.volify
+        n = self.load_volify(state)
+        if not is_loaded(live):
+            self.privmsg(channel, "Loaded corpus of %d messages." % n)
+            return
+        self.privmsg(channel, "Reloaded corpus of %d messages (%d states had drifted)." % (n, live.drift(state.volify)))
 
     @Command("insult", EVERYONE)
     def cmd_insult(self, sender, channel, cmd, args):
@@ -556,7 +790,7 @@ class VolBot(irc.bot.SingleServerIRCBot):
             insult = random.choice(compliments).replace('<nick>', victim)
             self.privmsg(channel, insult)
 
-    @Command("tellmeabout", EVERYONE)
+    @Command("tellmeabout", EVERYONE, offload=True)
     def cmd_tellmeabout(self, sender, channel, cmd, args):
         """tellmeabout [thing]\nGet basic info on <thing>."""
 
@@ -566,32 +800,30 @@ class VolBot(irc.bot.SingleServerIRCBot):
             query = " ".join(args)
         else:
             # otherwise get a random page
-            random = wikipedia.random(400)
-            query = random[0]
+            query = self.wiki.random_title()
 
         try:
             # 3 sentence limit. Can be extended later
-            summary = wikipedia.summary(query, 3)
-            summary = summary.replace('\n', ' ')
-            self.privmsg(channel, summary)
-        except wikipedia.exceptions.DisambiguationError as e:
-            op_list = e.options
-            message = "Try: %s" % "; ".join(op_list)
-            self.privmsg(channel, message)
+            summary, op_list = self.wiki.lookup(query)
+            if summary is not None:
+                self.privmsg(channel, summary)
+            else:
+                message = "Try: %s" % "; ".join(op_list)
+                self.privmsg(channel, message)
         except wikipedia.exceptions.WikipediaException:
             self.privmsg(channel, "Sorry, can't find that.")
 
-    @Command("ud", EVERYONE)
+    @Command("ud", EVERYONE, offload=True)
     def cmd_ud(self, sender, channel, cmd, args):
         """ud [word]\nLook up a word on Urban Dictionary."""
 
-        if len(args) > 0:
-            query = " ".join(args)
-        else:
-            query = urbandict.TermTypeRandom()
-
         try:
-            result = urbandict.define(query)[0]
+            if len(args) > 0:
+                query = " ".join(args)
+                result = self.caches['urbandict'].fetch(
+                    query.lower(), lambda: urbandict.define(query, limit=1))[0]
+            else:
+                result = urbandict.define(urbandict.TermTypeRandom(), limit=1)[0]
             resp = '%s\n"%s"' % (result['def'], result['example'].strip())
 
             self.privmsg(channel, result['word'])
@@ -599,7 +831,7 @@ class VolBot(irc.bot.SingleServerIRCBot):
         except:
             self.privmsg(channel, "Sorry, can't find that.")
 
-    @Command("last", EVERYONE)
+    @Command("last", EVERYONE, offload=True)
     def cmd_last(self, sender, channel, cmd, args):
         """last [num] [name]\nShow the last [num of messages] sent by [name]"""
 
@@ -615,6 +847,9 @@ class VolBot(irc.bot.SingleServerIRCBot):
                 self.privmsg(channel, "Invalid number.")
                 return
 
+        # make sure the latest lines (including this command) are in the db
+        self.log_writer.flush()
+
         if len(args) > 1:
             target = args[1]
 
@@ -630,6 +865,46 @@ class VolBot(irc.bot.SingleServerIRCBot):
         lines.reverse()
         self.privmsg(channel, "\n".join(lines))
         
+    @Command("triggers", OP_ONLY)
+    def cmd_triggers(self, sender, channel, cmd, args):
+        """triggers\nShow match statistics for the channel triggers."""
+        self.privmsg(channel, "\n".join(
+            "%s: %s" % (name, stats) for name, stats in self.triggers.stats()
+        ))
+
+    @Command("caches", OP_ONLY)
+    def cmd_caches(self, sender, channel, cmd, args):
+        """caches\nShow hit/miss statistics for the caches."""
+        caches = sorted(self.caches.items()) + [('mimic', self.mimics), ('corpora', self.corpora),
+                                                ('outbound', self.outbound)]
+        self.privmsg(channel, "\n".join(
+            "%s: %s" % (name, cache) for name, cache in caches
+        ))
+
+    @Command("perf", OP_ONLY)
+    def cmd_perf(self, sender, channel, cmd, args):
+        """perf [count]\nShow the handlers that have taken the most time, and queue depths."""
+        try:
+            count = int(args[0]) if args else 5
+        except ValueError:
+            self.send_usage(channel, self.cmd_perf)
+            return
+
+        series = sorted(self.handler_seconds.series(), key=lambda item: item[1].sum, reverse=True)
+        lines = []
+        for (kind, name), s in series[:count]:
+            errors = self.handler_errors.get(kind, name)
+            timeouts = self.handler_timeouts.get(kind, name)
+            lines.append("%s %s: %s errors=%d timeouts=%d" % (
+                kind, name, self.handler_seconds.describe(s), errors, timeouts))
+        for name, histogram in [('triggers', self.match_seconds), ('log_msg', self.log_seconds),
+                                ('send', self.send_seconds), ('send wait', self.send_wait)]:
+            lines.append("%s: %s" % (name, histogram.describe(histogram.total())))
+        lines.append("queues: outbound=%d workers=%d log_writer=%d translations=%d" % (
+            self.outbound.pending(), self.workers.pending(), self.log_writer.pending(),
+            self.auto_translations.queue.qsize()))
+        self.privmsg(channel, "\n".join(lines))
+
     @Command("echo", EVERYONE)
     def cmd_echo(self, sender, channel, cmd, args):
         '''echo [arg1, arg2....]\nDo I really need to tell you what this does?'''
@@ -655,7 +930,7 @@ class VolBot(irc.bot.SingleServerIRCBot):
             elif hasattr(obj, "trigger_pattern"):
                 pattern = getattr(obj, "trigger_pattern")
                 self.log('registered trigger "%s" to %s()' % (pattern, obj.__name__))
-                self.triggers.append((re.compile(pattern), obj))
+                self.triggers.add(obj)
 
     def send_usage(self, channel, cmd):
         """Send a command's usage"""
@@ -669,33 +944,62 @@ class VolBot(irc.bot.SingleServerIRCBot):
             self.send_split(target, line)
 
     def send_split(self, target, text):
-        """Send a single line to a target, splitting by maximum line length"""
-        MAX_LEN = 400  # fuck it
-
-        text = text.encode('utf-8')
-
-        words = text.split(" ")
-        parts = []
-
-        for word in words:
-            for i in xrange(0, len(word), MAX_LEN):
-                parts.append(word[i:i + MAX_LEN])
-
-        if len(parts) == 0:
+        """Send a single line to a target, split to fit in IRC's 512 byte lines"""
+        limit = privmsg_budget(target, self.connection.get_nickname(), *self.userhost)
+        for line in split_text(text, limit):
+            self.send_line(target, line)
+
+    def send_line(self, target, line):
+        """Queue a single line to be sent; safe to call from worker threads"""
+        # drop replies from handlers that have already timed out
+        if self.workers.cancelled():
             return
+        self.outbound.put(target, line)
+        if threading.current_thread() is self.reactor_thread:
+            self.outbound.drain()  # no need to wait for the next tick
+
+    def deliver(self, target, line):
+        """Log and send a line; called from the reactor by the outbound queue"""
+        self.log_msg(target, self._nickname, line)
+        with self.send_seconds.time():
+            self.connection.privmsg(target, line)
+
+    def run_command(self, handler, nick, target, cmd, args):
+        """Call a command handler, reporting any error to the target"""
+        try:
+            with self.handler_seconds.time('command', handler.cmd_label):
+                handler(nick, target, cmd, args)
+        except:
+            # self.pipe = False
+            self.handler_errors.inc('command', handler.cmd_label)
+            self.privmsg(target, "Oops. Internal error. Check my logs.")
+            traceback.print_exc()
 
-        line = parts[0]
-        for word in parts[1:]:
-            if len(line) + len(word) + 1 <= MAX_LEN:
-                line += " " + word
-            else:
-                self.log_msg(target, self._nickname, line.decode('utf-8'))
-                self.connection.privmsg(target, line.decode('utf-8'))
-                line = word
+    def run_trigger(self, handler, nick, channel, msg):
+        """Call a trigger handler, logging any error"""
+        try:
+            with self.handler_seconds.time('trigger', handler.__name__):
+                handler(nick, channel, msg)
+        except Exception:
+            self.handler_errors.inc('trigger', handler.__name__)
+            traceback.print_exc()
 
-        if len(line) > 0:
-            self.log_msg(target, self._nickname, line.decode('utf-8'))
-            self.connection.privmsg(target, line.decode('utf-8'))
+    def user_level(self, nick, target):
+        """Return nick's permission level for a command sent to target: from
+        their modes in that channel, or in any of our channels for a private
+        message"""
+        if target in self.channels:
+            channels = [self.channels[target]]
+        else:
+            channels = self.channels.values()
+
+        if nick == self.owner:
+            return OWNER
+        if any(chan.is_oper(nick) for chan in channels):
+            return OP_ONLY
+        if any(chan.is_voiced(nick) for chan in channels):
+            return VOICE_ONLY
+        return EVERYONE
 
     def do_command(self, e, target, cmd, args):
         """Find the appropriate command handler and call it"""
@@ -707,54 +1011,87 @@ class VolBot(irc.bot.SingleServerIRCBot):
             # if so, look up and call the command handler
             handler = self.commands[cmd.lower()]
 
-            chan = self.channels[self.channel]
-
-            user_level = 0
-            if chan.is_oper(nick):
-                user_level = 100
-            elif nick == OWNER_NICK:
-                user_level = 150
-            elif chan.is_voiced(nick):
-                user_level = 50
-
-            if user_level >= handler.cmd_perms:
-                try:
-                    handler(nick, target, cmd, args)
-                except:
-                    # self.pipe = False
-                    self.privmsg(target, "Oops. Internal error. Check my logs.")
-                    traceback.print_exc()
+            if self.user_level(nick, target) >= handler.cmd_perms:
+                def timed_out():
+                    self.handler_timeouts.inc('command', handler.cmd_label)
+                    self.privmsg(target, "Sorry, that took too long.")
+                if not self.dispatch(target, handler.offload, self.run_command, (handler, nick, target, cmd, args),
+                                     handler.timeout, timed_out):
+                    self.privmsg(target, "I'm busy, try again in a bit.")
 
             else:
-                self.privmsg(target, "no way")
+                self.dispatch(target, False, self.privmsg, (target, "no way"))
         else:
             # otherwise print an error message
-            self.privmsg(target, "what?")
+            self.dispatch(target, False, self.privmsg, (target, "what?"))
+
+    def dispatch(self, key, offload, func, args, timeout=None, on_timeout=None):
+        """Call func(*args) on the worker pool if offload is set, or if earlier
+        jobs for key are still waiting there (so a quick reply can't overtake
+        a slow one to the same channel); otherwise call it right away.
+        Returns False if the pool is too busy to take it."""
+        if offload or self.workers.busy(key):
+            return self.workers.submit(key, func, args, timeout, on_timeout)
+        func(*args)
+        return True
+
+def parse_server(spec):
+    """Parse server[:port] into (server, port)"""
+    s = spec.split(":", 1)
+    if len(s) == 1:
+        return s[0], 6667
+    try:
+        return s[0], int(s[1])
+    except ValueError:
+        raise argparse.ArgumentTypeError("Erroneous port.")
+
+
+def run_bot(server, port, channels, index, nickname, owner, prepare_db=True, sharded=False):
+    """Run a bot until it exits; the target of each process when sharded.
+
+    Each process serves its metrics on its own port, METRICS_PORT + index,
+    and when sharded keeps its own on-disk caches.
+    """
+    metrics_port = None if METRICS_PORT is None else METRICS_PORT + index
+    bot = VolBot(channels, nickname, server, port, owner=owner, prepare_db=prepare_db, metrics_port=metrics_port,
+                 shard=index if sharded else None)
+    bot.start()
+
 
 def main():
     # get command line args
-    if len(sys.argv) != 5:
-        print("Usage: testbot <server[:port]> <channel> <nickname> <owner_nickname>")
-        sys.exit(1)
-
-    s = sys.argv[1].split(":", 1)
-    server = s[0]
-    if len(s) == 2:
+    parser = argparse.ArgumentParser(prog='volbot')
+    parser.add_argument('server', type=parse_server, help='server[:port]')
+    parser.add_argument('channels', help='channel to join, or several separated by commas')
+    parser.add_argument('nickname')
+    parser.add_argument('owner_nickname')
+    parser.add_argument('--network', nargs=2, action='append', default=[], metavar=('SERVER[:PORT]', 'CHANNELS'),
+                        help='also join CHANNELS on another server (may be repeated)')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='number of bot processes to spread the channels across')
+    args = parser.parse_args()
+
+    networks = [Network(args.server[0], args.server[1], args.channels.split(','))]
+    for spec, channels in args.network:
         try:
-            port = int(s[1])
-        except ValueError:
-            print("Error: Erroneous port.")
-            sys.exit(1)
-    else:
-        port = 6667
-    channel = sys.argv[2]
-    nickname = sys.argv[3]
-    global OWNER_NICK
-    OWNER_NICK = sys.argv[4]
-
-    # run the bot
-    bot = VolBot(channel, nickname, server, port)
-    bot.start()
+            server, port = parse_server(spec)
+        except argparse.ArgumentTypeError as e:
+            parser.error(str(e))
+        networks.append(Network(server, port, channels.split(',')))
+
+    # run the bot, in this process if we can
+    if len(networks) == 1 and args.processes <= 1:
+        run_bot(args.server[0], args.server[1], networks[0].channels, 0, args.nickname, args.owner_nickname)
+        return
+
+    def prepare():
+        client = pymongo.MongoClient("localhost", 27017)
+        prepare_db(client.irc)
+        client.close()  # don't share its sockets with the bot processes
+
+    target = functools.partial(run_bot, nickname=args.nickname, owner=args.owner_nickname, prepare_db=False,
+                               sharded=True)
+    Coordinator(assign(networks, args.processes), target, prepare=prepare, log=log).run()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,74 @@
+"""wiki.py - Cached Wikipedia summaries and a prefetched pool of random titles"""
+
+import collections
+import threading
+import traceback
+
+from .utils import lazy_import
+
+wikipedia = lazy_import('wikipedia')
+
+
+class Wiki(object):
+    """Look up Wikipedia summaries through a TTLCache.
+
+    A summary lookup returns (summary, options): options is the list of
+    suggestions when the query was ambiguous and summary is None.  Both
+    outcomes are cached; other Wikipedia errors are cached briefly as
+    failures.  Random titles are drawn from a pool that a background
+    thread tops up whenever it runs low (starting with the first request,
+    or prefetch()), warming the summaries of the next few titles so a
+    random lookup rarely has to wait on Wikipedia.
+    """
+
+    def __init__(self, cache, sentences=3, batch=20, low_water=5, warm=3):
+        self.cache = cache
+        self.sentences = sentences
+        self.batch = batch
+        self.low_water = low_water
+        self.warm = warm
+
+        self.pool = collections.deque()
+        self._low = threading.Event()
+        thread = threading.Thread(target=self._refill, name="volbot-wiki")
+        thread.daemon = True
+        thread.start()
+
+    def _load(self, query):
+        try:
+            summary = wikipedia.summary(query, self.sentences)
+            return summary.replace('\n', ' '), None
+        except wikipedia.exceptions.DisambiguationError as e:
+            return None, e.options
+
+    def lookup(self, query):
+        """Return (summary, options) for query; raises WikipediaException"""
+        return self.cache.fetch(query, lambda: self._load(query))
+
+    def prefetch(self):
+        """Start filling the pool of random titles"""
+        self._low.set()
+
+    def random_title(self):
+        """Return a random article title, from the pool if possible"""
+        try:
+            title = self.pool.popleft()
+        except IndexError:
+            title = None
+        if len(self.pool) <= self.low_water:
+            self._low.set()
+        return title or wikipedia.random(1)
+
+    def _refill(self):
+        while True:
+            self._low.wait()
+            self._low.clear()
+            try:
+                self.pool.extend(wikipedia.random(self.batch))
+                for title in list(self.pool)[:self.warm]:
+                    try:
+                        self.lookup(title)
+                    except wikipedia.exceptions.WikipediaException:
+                        pass
+            except Exception:
+                traceback.print_exc()
@@ -0,0 +1,157 @@
+"""workers.py - Bounded thread pool for handlers that block on I/O"""
+
+import collections
+import Queue
+import threading
+import time
+import traceback
+
+
+class Job(object):
+    """A single queued call"""
+
+    def __init__(self, key, func, args, timeout, on_timeout):
+        self.key = key
+        self.func = func
+        self.args = args
+        self.timeout = timeout
+        self.on_timeout = on_timeout
+        self.deadline = None
+        self.expired = False
+        self.released = False
+
+    @property
+    def name(self):
+        return getattr(self.func, '__name__', repr(self.func))
+
+
+class WorkerPool(object):
+    """Run blocking calls on a fixed number of worker threads.
+
+    Jobs are submitted under a key (the channel or nick a reply goes to).
+    Jobs sharing a key run one at a time in submission order, so replies to
+    a channel stay in order, while jobs for different keys run in parallel.
+    A job that runs past its timeout is abandoned: the next job for its key
+    is started, a replacement worker is spawned, and anything the late job
+    tries to send can be suppressed by checking cancelled().
+    """
+
+    def __init__(self, size=4, timeout=30.0, max_pending=100):
+        self.size = size
+        self.timeout = timeout
+        self.max_pending = max_pending
+
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.rejected = 0
+
+        self._lock = threading.Lock()
+        self._jobs = {}  # key -> deque of jobs waiting behind the running one
+        self._running = set()
+        self._ready = Queue.Queue()  # keys whose next job may start
+        self._pending = 0
+        self._local = threading.local()
+
+        for _ in xrange(size):
+            self._spawn()
+        watchdog = threading.Thread(target=self._watch, name="volbot-watchdog")
+        watchdog.daemon = True
+        watchdog.start()
+
+    def submit(self, key, func, args=(), timeout=None, on_timeout=None):
+        """Queue func(*args) to run after earlier jobs for key.
+
+        Returns False if too many jobs are already waiting.
+        """
+        job = Job(key, func, args, timeout or self.timeout, on_timeout)
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                return False
+            self._pending += 1
+            self._jobs.setdefault(key, collections.deque()).append(job)
+            if len(self._jobs[key]) == 1:
+                self._ready.put(key)
+        return True
+
+    def pending(self):
+        """Return the number of jobs queued or running"""
+        return self._pending
+
+    def busy(self, key):
+        """Return whether jobs for key are queued or running"""
+        with self._lock:
+            return key in self._jobs
+
+    def cancelled(self):
+        """Return whether the job running on this thread has timed out"""
+        job = getattr(self._local, 'job', None)
+        return job is not None and job.expired
+
+    def _spawn(self):
+        worker = threading.Thread(target=self._work, name="volbot-worker")
+        worker.daemon = True
+        worker.start()
+
+    def _work(self):
+        while True:
+            key = self._ready.get()
+            with self._lock:
+                job = self._jobs[key][0]
+                job.deadline = time.time() + job.timeout
+                self._running.add(job)
+
+            self._local.job = job
+            try:
+                job.func(*job.args)
+                self.completed += 1
+            except Exception:
+                self.failed += 1
+                traceback.print_exc()
+            finally:
+                self._local.job = None
+                self._release(job)
+
+            # this thread was replaced while the job was stuck
+            if job.expired:
+                return
+
+    def _release(self, job):
+        """Let the next job for the same key start"""
+        with self._lock:
+            self._running.discard(job)
+            if job.released:
+                return
+            job.released = True
+            self._pending -= 1
+            jobs = self._jobs[job.key]
+            jobs.popleft()
+            if jobs:
+                self._ready.put(job.key)
+            else:
+                del self._jobs[job.key]
+
+    def _watch(self):
+        while True:
+            time.sleep(0.5)
+            now = time.time()
+            with self._lock:
+                overdue = [job for job in self._running
+                           if not job.expired and job.deadline < now]
+                for job in overdue:
+                    job.expired = True
+            for job in overdue:
+                self.timed_out += 1
+                print "%s for %s timed out after %.1fs" % (job.name, job.key, job.timeout)
+                self._release(job)
+                self._spawn()
+                if job.on_timeout is not None:
+                    try:
+                        job.on_timeout()
+                    except Exception:
+                        traceback.print_exc()
+
+    def __str__(self):
+        return "pending=%d completed=%d failed=%d timed_out=%d rejected=%d" % (
+            self._pending, self.completed, self.failed, self.timed_out, self.rejected)